@@ -34,6 +34,9 @@ FACILITY_KEYWORDS = [
     'HUB'
 ]
 
+# Optional JSON file extending FACILITY_KEYWORDS / EXPRESS_SERVICES with other carriers' vocabularies
+CLASSIFICATION_RULES_FILE = 'config/classification_rules.json'
+
 # Weight conversion factors
 WEIGHT_CONVERSIONS = {
     'g': 0.001,
@@ -54,4 +57,74 @@ DEFAULT_VALUES = {
 CARRIER_MAPPINGS = {
     'FDXE': 'FedEx Express',
     'FDXG': 'FedEx Ground'
-}
\ No newline at end of file
+}
+
+# Streaming sketch sizing for network-wide distinct counts and top-N reports
+SKETCH_SETTINGS = {
+    'hll_precision': 14,           # 2^14 registers, ~0.8% standard error
+    'cms_width': 2048,
+    'cms_depth': 4,
+    'heavy_hitter_capacity': 100,  # Space-Saving counters kept per dimension
+    'top_n': 5
+}
+
+# Promised door-to-door transit hours per express service (SLA breach threshold)
+SLA_TRANSIT_HOURS = {
+    'FEDEX_FIRST_OVERNIGHT': 24.0,
+    'FEDEX_PRIORITY_OVERNIGHT': 24.0,
+    'FEDEX_STANDARD_OVERNIGHT': 24.0,
+    'FEDEX_2_DAY_AM': 48.0,
+    'FEDEX_2_DAY': 48.0,
+    'FEDEX_EXPRESS_SAVER': 72.0,
+    'EXPRESS': 72.0
+}
+
+# Transit-hour percentiles reported in the summary
+SUMMARY_PERCENTILES = [90, 95, 99]
+
+# Timezone for *_datetime_ist output columns (timestamps are UTC epochs internally)
+OUTPUT_TIMEZONE = 'Asia/Kolkata'
+
+# Streaming pipeline: records per batch and batches buffered between stages
+PIPELINE_SETTINGS = {
+    'batch_size': 500,
+    'queue_size': 2
+}
+
+# Robust anomaly scoring of shipments against per-lane / per-service baselines
+ANOMALY_SETTINGS = {
+    'features': [
+        'total_transit_hours',
+        'time_in_inter_facility_transit_hours',
+        'max_scan_gap_hours',
+        'num_out_for_delivery_attempts'
+    ],
+    'min_group_size': 5,        # smaller lanes/services fall back to a broader baseline
+    'score_threshold': 3.5,     # robust z-score at or above which a shipment is flagged
+    'min_scale': {              # floor for 1.4826 * MAD so tight groups don't flag noise
+        'total_transit_hours': 2.0,
+        'time_in_inter_facility_transit_hours': 2.0,
+        'max_scan_gap_hours': 2.0,
+        'num_out_for_delivery_attempts': 0.5
+    },
+    'in_flight_features': {     # open clocks scored as lower bounds of a feature's final value
+        'total_transit_hours': 'elapsed_hours_since_pickup',
+        'max_scan_gap_hours': 'hours_since_last_scan'
+    },
+    'bin_width': {              # histogram bin per feature; medians/MADs are exact to half a bin
+        'total_transit_hours': 0.1,
+        'time_in_inter_facility_transit_hours': 0.1,
+        'max_scan_gap_hours': 0.1,
+        'num_out_for_delivery_attempts': 1.0
+    },
+    'baselines_file': 'output/anomaly_baselines.json',
+    'exceptions_file': 'output/transit_exceptions.csv'
+}
+
+# In-flight mode: open-ended clocks for undelivered shipments against an as-of time
+INFLIGHT_SETTINGS = {
+    'enabled': True,
+    'as_of': None,              # UTC epoch ms; None = time of the run
+    'stale_scan_hours': 24,     # no scan for longer than this marks a shipment stale
+    'in_flight_file': 'output/transit_in_flight.csv'
+}
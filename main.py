@@ -11,10 +11,25 @@ import time
 # Add src to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from config.constants import INFLIGHT_SETTINGS
+from src.anomaly_detector import AnomalyDetector
+from src.carriers import default_registry
 from src.data_loader import DataLoader
 from src.data_processor import DataProcessor
 from src.metrics_calculator import MetricsCalculator
 from src.output_generator import OutputGenerator
+from src.pipeline import PipelineScheduler, process_peak_rss_kb
+
+
+def resolve_as_of():
+    """
+    Reference time (UTC epoch ms) for in-flight clocks, or None when disabled
+    """
+    if not INFLIGHT_SETTINGS['enabled']:
+        return None
+    if INFLIGHT_SETTINGS['as_of'] is not None:
+        return int(INFLIGHT_SETTINGS['as_of'])
+    return int(time.time() * 1000)
 
 
 def main():
@@ -28,55 +43,106 @@ def main():
     print()
     
     # Step 1: Initialize components
-    data_loader = DataLoader()
-    data_processor = DataProcessor()
-    metrics_calculator = MetricsCalculator()
+    carrier_registry = default_registry()
+    data_loader = DataLoader(carrier_registry)
+    data_processor = DataProcessor(registry=carrier_registry)
+    metrics_calculator = MetricsCalculator(as_of=resolve_as_of())
     output_generator = OutputGenerator()
     
-    # Step 2: Load data
+    # Step 2: Stream data through the pipeline
     data_file = 'data/shipment_data.json'
     
-    print("1. 📥 LOADING DATA")
+    print("1. 📥 LOADING, PROCESSING & CALCULATING (streaming pipeline)")
     print("-" * 40)
     
-    if not data_loader.load_data(data_file):
+    scheduler = PipelineScheduler()
+    performance_metrics = []
+    
+    try:
+        stage_stats = scheduler.run(
+            data_loader.iter_shipments(data_file),
+            [
+                ('process', data_processor.process_batch),
+                ('metrics', metrics_calculator.calculate_batch)
+            ],
+            performance_metrics.extend
+        )
+    except Exception as e:
+        print(f"❌ Pipeline failed: {e}")
+        return 1
+    
+    data_loader.print_validation_report()
+    if not data_loader.validation_report.get('valid_shipments'):
         print("❌ Cannot proceed without data")
         return 1
     
     data_loader.explore_sample()
-    raw_data = data_loader.get_data()
     
-    # Step 3: Process data
-    print("\n2. 🔄 PROCESSING DATA")
-    print("-" * 40)
+    processing_stats = data_processor.get_processing_stats()
+    print(f"\n✅ Streamed {data_loader.validation_report['total_shipments']} shipments "
+          f"(batch size {scheduler.batch_size}, queue size {scheduler.queue_size})")
+    print(f"   🧹 Duplicate events dropped: {processing_stats['duplicate_events_dropped']}")
+    print(f"   ⏩ Event sorts skipped (already ordered): {processing_stats['sorts_skipped']}")
     
-    flattened_data = data_processor.process_shipments(raw_data)
+    print(f"\n📦 Stage report:")
+    for stage in stage_stats:
+        print(f"   {stage['stage']:<8} batches={stage['batches']:<4} "
+              f"in={stage['records_in']:<6} out={stage['records_out']:<6} "
+              f"busy={stage['busy_seconds']:.2f}s peak_mem={stage['peak_in_flight_kb']:.1f} KB "
+              f"peak_queue={stage['peak_queue_depth']}")
     
-    if not flattened_data:
-        print("❌ No data processed")
-        return 1
-    
-    # Step 4: Calculate metrics
-    print("\n3. 📊 CALCULATING METRICS")
-    print("-" * 40)
-    
-    performance_metrics = metrics_calculator.calculate_metrics(flattened_data)
+    peak_rss = process_peak_rss_kb()
+    if peak_rss is not None:
+        print(f"   process peak RSS: {peak_rss / 1024:.1f} MB")
     
     if not performance_metrics:
         print("❌ No metrics calculated")
         return 1
     
-    # Step 5: Generate outputs
-    print("\n4. 📁 GENERATING OUTPUTS")
+    # Step 3: Generate outputs
+    print("\n2. 📁 GENERATING OUTPUTS")
     print("-" * 40)
     
     # Create CSV files
     detailed_file = output_generator.generate_detailed_csv(performance_metrics)
-    summary_file = output_generator.generate_summary_csv(performance_metrics)
+    summary_file = output_generator.generate_summary_csv(
+        performance_metrics,
+        data_processor.get_sketches(),
+        data_processor.get_processing_stats()
+    )
+    
+    in_flight_file = output_generator.generate_in_flight_csv(performance_metrics)
     
     # Print report
     output_generator.print_report(performance_metrics)
     
+    # Step 4: Score shipments against cached robust baselines
+    print("\n3. 🚨 ANOMALY DETECTION")
+    print("-" * 40)
+    
+    # Baselines are built from completed shipments only; in-flight
+    # shipments are scored on their open clocks against them
+    delivered_metrics = [m for m in performance_metrics if m['shipment_status'] != 'in_flight']
+    exceptions_file = ""
+    
+    anomaly_detector = AnomalyDetector()
+    cached = anomaly_detector.load()
+    if cached:
+        print("📂 Scoring against cached baselines")
+    elif delivered_metrics:
+        print("🆕 No cached baselines, computing from this run")
+        anomaly_detector.fit(delivered_metrics)
+    else:
+        print("⚠️  No delivered shipments to build baselines from")
+    
+    if cached or delivered_metrics:
+        anomaly_scores = anomaly_detector.score(performance_metrics)
+        exceptions_file = anomaly_detector.write_exceptions(anomaly_scores)
+        if cached:
+            added = anomaly_detector.update(delivered_metrics)
+            print(f"   ➕ Folded {added} new shipments into the baselines")
+        anomaly_detector.save()
+    
     # Final summary
     execution_time = time.time() - start_time
     
@@ -97,6 +163,14 @@ def main():
         size = os.path.getsize(summary_file) / 1024
         print(f"   • Summary CSV: {summary_file} ({size:.1f} KB)")
     
+    if in_flight_file and os.path.exists(in_flight_file):
+        size = os.path.getsize(in_flight_file) / 1024
+        print(f"   • In-flight CSV: {in_flight_file} ({size:.1f} KB)")
+    
+    if exceptions_file and os.path.exists(exceptions_file):
+        size = os.path.getsize(exceptions_file) / 1024
+        print(f"   • Exceptions CSV: {exceptions_file} ({size:.1f} KB)")
+    
     print(f"\n🛡️  EDGE CASES HANDLED:")
     cases = [
         "Missing/null values",
@@ -0,0 +1,310 @@
+"""
+Robust (median/MAD) anomaly scoring of per-shipment transit metrics
+"""
+import json
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.constants import ANOMALY_SETTINGS
+from src.transit_stats import lane_keys
+
+# Scales MAD to a standard deviation for normally distributed data
+MAD_TO_SIGMA = 1.4826
+
+# Baseline levels, most specific first
+LEVELS = ['lane', 'service', 'global']
+
+
+def _weighted_median(values: np.ndarray, counts: np.ndarray) -> float:
+    """
+    Median of `values` (sorted ascending) each repeated `counts` times,
+    averaging the two middle ranks for an even total like pandas' median
+    """
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1])
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return float((lower + upper) / 2)
+
+
+def histogram_median_mad(bins: Dict[int, int], bin_width: float) -> Tuple[float, float]:
+    """
+    Median and median absolute deviation of a fixed-width histogram
+    ({bin index: count}, bin i holding values that round to i * bin_width)
+    """
+    indices = np.array(sorted(bins), dtype=np.int64)
+    counts = np.array([bins[i] for i in indices], dtype=np.int64)
+    values = indices * bin_width
+
+    median = _weighted_median(values, counts)
+    deviations = np.abs(values - median)
+    order = np.argsort(deviations, kind='stable')
+    return median, _weighted_median(deviations[order], counts[order])
+
+
+class AnomalyDetector:
+    """
+    Scores shipments against per-lane and per-service median/MAD baselines
+
+    Each group keeps a fixed-width histogram per feature. Histograms merge
+    exactly by adding counts, so folding in later runs gives the same
+    median/MAD as refitting on the whole history (up to half a bin width),
+    and outliers move them no more than they would in a refit. Histograms
+    are cached to disk with an event-time watermark; later runs score
+    against the cache and fold in only shipments newer than the watermark,
+    so re-running on the same input leaves the baselines unchanged.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.settings = dict(ANOMALY_SETTINGS, **(settings or {}))
+        self.features = list(self.settings['features'])
+        self.bin_widths = {
+            feature: float(self.settings['bin_width'].get(feature, 0.1)) for feature in self.features
+        }
+        # level -> group key -> {'count': n, 'bins': {feature: {bin index: count}}}
+        self.histograms: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # level -> DataFrame indexed by group key: count, <feature>_median, <feature>_mad
+        self.baselines: Dict[str, pd.DataFrame] = {}
+        # Latest event time (UTC epoch ms) folded in, and the shipments at exactly that time
+        self.watermark: Optional[int] = None
+        self.watermark_tracking_numbers: set = set()
+
+    def _frame(self, metrics: List[Dict[str, Any]]) -> pd.DataFrame:
+        df = pd.DataFrame(metrics)
+        for feature in self.features:
+            df[feature] = pd.to_numeric(df.get(feature), errors='coerce').fillna(0.0)
+        df['lane'] = lane_keys(df)
+        df['service'] = df['service_type'].astype(str)
+        df['global'] = 'ALL'
+        df['tracking_number'] = df['tracking_number'].astype(str)
+        # Delivery time, or the latest scan for shipments without one
+        event_time = pd.to_numeric(df.get('delivery_datetime_ist'), errors='coerce')
+        if 'last_scan_datetime_ist' in df:
+            event_time = event_time.fillna(pd.to_numeric(df['last_scan_datetime_ist'], errors='coerce'))
+        df['event_time'] = event_time.fillna(-np.inf)
+        return df
+
+    def _add_to_histograms(self, df: pd.DataFrame) -> None:
+        for level in LEVELS:
+            groups = self.histograms.setdefault(level, {})
+            for key, count in df.groupby(level).size().items():
+                group = groups.setdefault(str(key), {'count': 0, 'bins': {f: {} for f in self.features}})
+                group['count'] += int(count)
+
+            for feature in self.features:
+                bin_index = np.rint(df[feature].to_numpy(dtype=float) / self.bin_widths[feature]).astype(np.int64)
+                counts = df.groupby([df[level], bin_index]).size()
+                for (key, index), count in counts.items():
+                    bins = groups[str(key)]['bins'][feature]
+                    bins[int(index)] = bins.get(int(index), 0) + int(count)
+
+    def _summarize(self) -> None:
+        """Derive median/MAD baselines from the histograms"""
+        self.baselines = {}
+        for level in LEVELS:
+            rows = {}
+            for key, group in self.histograms.get(level, {}).items():
+                row = {'count': group['count']}
+                for feature in self.features:
+                    median, mad = histogram_median_mad(group['bins'][feature], self.bin_widths[feature])
+                    row[f'{feature}_median'] = median
+                    row[f'{feature}_mad'] = mad
+                rows[key] = row
+            self.baselines[level] = pd.DataFrame.from_dict(rows, orient='index')
+
+    def _advance_watermark(self, df: pd.DataFrame) -> None:
+        latest = df['event_time'].max()
+        if not np.isfinite(latest):
+            return
+        at_latest = set(df.loc[df['event_time'] == latest, 'tracking_number'])
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = int(latest)
+            self.watermark_tracking_numbers = at_latest
+        elif latest == self.watermark:
+            self.watermark_tracking_numbers |= at_latest
+
+    def _fold(self, df: pd.DataFrame) -> None:
+        self._add_to_histograms(df)
+        self._advance_watermark(df)
+        self._summarize()
+
+    def fit(self, metrics: List[Dict[str, Any]]) -> None:
+        """
+        Compute baselines from scratch
+        """
+        self.histograms = {}
+        self.watermark = None
+        self.watermark_tracking_numbers = set()
+        self._fold(self._frame(metrics))
+
+    def update(self, metrics: List[Dict[str, Any]]) -> int:
+        """
+        Fold shipments newer than the watermark into the baselines; returns
+        the number of shipments added
+
+        Shipments at or before the watermark are taken as already counted
+        (late arrivals older than the latest folded shipment are skipped).
+        """
+        if not metrics:
+            return 0
+
+        if not self.histograms:
+            self.fit(metrics)
+            return len(metrics)
+
+        df = self._frame(metrics)
+        if self.watermark is not None:
+            newer = df['event_time'] > self.watermark
+            tied = (df['event_time'] == self.watermark) & ~df['tracking_number'].isin(self.watermark_tracking_numbers)
+            df = df[newer | tied]
+        if df.empty:
+            return 0
+
+        self._fold(df)
+        return len(df)
+
+    def score(self, metrics: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Robust z-score of every feature against the most specific baseline
+        with at least `min_group_size` shipments; anomaly_score is the
+        largest upward deviation across features
+
+        In-flight shipments are scored on their open clocks: a clock from
+        `in_flight_features` (time since pickup, time since the last scan)
+        is a lower bound of the feature's final value, so the larger of the
+        two is scored and a stuck shipment is flagged before it is delivered.
+        """
+        if not self.baselines:
+            raise ValueError("No baselines: call fit() or load() first")
+
+        df = self._frame(metrics)
+        status = df['shipment_status'] if 'shipment_status' in df else pd.Series(None, index=df.index, dtype=object)
+        in_flight = (status == 'in_flight').to_numpy()
+        if in_flight.any():
+            for feature, clock in self.settings['in_flight_features'].items():
+                if feature in self.features and clock in df:
+                    open_clock = pd.to_numeric(df[clock], errors='coerce').fillna(0.0)
+                    df.loc[in_flight, feature] = np.maximum(df[feature], open_clock)[in_flight]
+        min_group_size = self.settings['min_group_size']
+        min_scale = self.settings['min_scale']
+
+        chosen_level = np.full(len(df), 'global', dtype=object)
+        medians = {f: np.full(len(df), np.nan) for f in self.features}
+        mads = {f: np.full(len(df), np.nan) for f in self.features}
+
+        # Fill from most general to most specific so specific baselines win
+        for level in reversed(LEVELS):
+            baseline = self.baselines[level].reindex(df[level])
+            usable = (baseline['count'].fillna(0) >= min_group_size).to_numpy()
+            if level == 'global':
+                usable = np.ones(len(df), dtype=bool)
+            chosen_level[usable] = level
+            for feature in self.features:
+                medians[feature][usable] = baseline[f'{feature}_median'].to_numpy()[usable]
+                mads[feature][usable] = baseline[f'{feature}_mad'].to_numpy()[usable]
+
+        scores = pd.DataFrame({
+            'tracking_number': df['tracking_number'],
+            'service_type': df['service_type'],
+            'lane': df['lane'],
+            'shipment_status': status.to_numpy(),
+            'baseline_level': chosen_level
+        })
+
+        z_columns = []
+        for feature in self.features:
+            scale = np.maximum(MAD_TO_SIGMA * np.nan_to_num(mads[feature]), min_scale.get(feature, 1.0))
+            z = (df[feature].to_numpy(dtype=float) - np.nan_to_num(medians[feature])) / scale
+            scores[feature] = df[feature]
+            scores[f'{feature}_baseline_median'] = np.round(medians[feature], 2)
+            scores[f'{feature}_z'] = np.round(z, 2)
+            z_columns.append(f'{feature}_z')
+
+        z_matrix = scores[z_columns].to_numpy(dtype=float)
+        scores['anomaly_score'] = np.round(z_matrix.max(axis=1), 2)
+        scores['primary_reason'] = np.array(self.features)[z_matrix.argmax(axis=1)]
+        scores['is_anomaly'] = scores['anomaly_score'] >= self.settings['score_threshold']
+
+        return scores.sort_values('anomaly_score', ascending=False, kind='stable').reset_index(drop=True)
+
+    def save(self, file_path: Optional[str] = None) -> str:
+        """Cache histograms and watermark as JSON"""
+        file_path = file_path or self.settings['baselines_file']
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        payload = {
+            'features': self.features,
+            'bin_width': self.bin_widths,
+            'watermark': self.watermark,
+            'watermark_tracking_numbers': sorted(self.watermark_tracking_numbers),
+            'histograms': {
+                level: {
+                    key: {
+                        'count': group['count'],
+                        'bins': {
+                            feature: {str(index): count for index, count in sorted(bins.items())}
+                            for feature, bins in group['bins'].items()
+                        }
+                    }
+                    for key, group in groups.items()
+                }
+                for level, groups in self.histograms.items()
+            }
+        }
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(payload, file, indent=2)
+        return file_path
+
+    def load(self, file_path: Optional[str] = None) -> bool:
+        """Load cached histograms; False if there is no usable cache"""
+        file_path = file_path or self.settings['baselines_file']
+        if not os.path.exists(file_path):
+            return False
+
+        with open(file_path, 'r', encoding='utf-8') as file:
+            payload = json.load(file)
+
+        if payload.get('features') != self.features or payload.get('bin_width') != self.bin_widths:
+            print("⚠️  Cached anomaly baselines use different features or bins, ignoring cache")
+            return False
+
+        if 'histograms' not in payload:
+            print("⚠️  Cached anomaly baselines predate histogram baselines, ignoring cache")
+            return False
+
+        self.histograms = {
+            level: {
+                key: {
+                    'count': group['count'],
+                    'bins': {
+                        feature: {int(index): count for index, count in bins.items()}
+                        for feature, bins in group['bins'].items()
+                    }
+                }
+                for key, group in groups.items()
+            }
+            for level, groups in payload['histograms'].items()
+        }
+        if not all(self.histograms.get(level) for level in LEVELS):
+            return False
+
+        self.watermark = payload.get('watermark')
+        self.watermark_tracking_numbers = set(payload.get('watermark_tracking_numbers', []))
+        self._summarize()
+        return True
+
+    def write_exceptions(self, scores: pd.DataFrame, file_path: Optional[str] = None) -> str:
+        """
+        Write flagged shipments, highest score first
+        """
+        file_path = file_path or self.settings['exceptions_file']
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+        exceptions = scores[scores['is_anomaly']].drop(columns=['is_anomaly']).copy()
+        exceptions.insert(0, 'rank', range(1, len(exceptions) + 1))
+        exceptions.to_csv(file_path, index=False)
+
+        print(f"🚨 Exceptions CSV: {file_path} ({len(exceptions)} flagged of {len(scores)})")
+        return file_path
@@ -0,0 +1,284 @@
+"""
+Carrier adapters and registry for multi-carrier ingestion
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+from config.constants import (
+    CARRIER_MAPPINGS, EVENT_CATEGORIES, FACILITY_KEYWORDS, EXPRESS_SERVICES,
+    WEIGHT_CONVERSIONS, DEFAULT_VALUES
+)
+from src.classifiers import ShipmentClassifiers
+
+UNKNOWN_ADDRESS = {'city': 'UNKNOWN', 'state': 'UNKNOWN', 'postal_code': 'UNKNOWN'}
+
+
+class CarrierAdapter(ABC):
+    """
+    Base class for carrier-specific extraction, field normalization, event
+    categorization and service classification
+
+    Subclasses set `name`, implement `matches` and `extract_shipments`, and
+    may override the class-level vocabularies (`event_categories`,
+    `facility_keywords`, `express_services`) and the normalization hooks
+    (`normalize_address`, `parse_timestamp`, `parse_weight`) for their
+    carrier's field formats. Extracted shipments keep the record layout read
+    by DataProcessor (trackingNumber, service, package, origin/destination
+    address, events); the hooks of the adapter that extracted a shipment
+    turn its addresses, timestamps and weights into normalized values.
+
+    The base hooks read the normalized formats: addresses as
+    {"city", "state", "postal_code"}, timestamps as ISO-8601 strings or UTC
+    epoch milliseconds, weights as {"value", "units"} or kilograms.
+    """
+
+    name = 'base'
+    carrier_codes: tuple = ()
+    event_categories: Dict[str, List[str]] = EVENT_CATEGORIES
+    facility_keywords: List[str] = FACILITY_KEYWORDS
+    express_services: List[str] = EXPRESS_SERVICES
+
+    def __init__(self, rules_file: Optional[str] = None):
+        self.classifiers = ShipmentClassifiers(
+            rules_file,
+            facility_keywords=self.facility_keywords,
+            express_services=self.express_services,
+            carrier=self.name
+        )
+        self._category_cache: Dict[tuple, str] = {}
+
+    @abstractmethod
+    def matches(self, record: Dict[str, Any]) -> bool:
+        """Whether this adapter understands a raw input record"""
+
+    @abstractmethod
+    def extract_shipments(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Extract shipments from a raw input record"""
+
+    def normalize_address(self, address: Any) -> Dict[str, str]:
+        """Address as {'city', 'state', 'postal_code'}"""
+        if not address or not isinstance(address, dict):
+            return dict(UNKNOWN_ADDRESS)
+
+        return {
+            'city': address.get('city', 'UNKNOWN'),
+            'state': address.get('state', 'UNKNOWN'),
+            'postal_code': address.get('postal_code', 'UNKNOWN')
+        }
+
+    def parse_timestamp(self, timestamp: Any) -> Optional[int]:
+        """
+        Timestamp as UTC epoch milliseconds (None if missing or unparseable)
+
+        Kept as int64 epochs through the pipeline; conversion to IST happens
+        once, vectorized, in OutputGenerator.
+        """
+        if not timestamp:
+            return None
+
+        try:
+            if isinstance(timestamp, str):
+                ts_clean = timestamp.strip().replace('Z', '+00:00')
+
+                try:
+                    parsed = datetime.fromisoformat(ts_clean)
+                except ValueError:
+                    parsed = None
+                    for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f']:
+                        try:
+                            parsed = datetime.strptime(ts_clean.replace('T', ' '), fmt)
+                            break
+                        except ValueError:
+                            continue
+                    if parsed is None:
+                        return None
+
+                # Strings without an offset are taken as UTC
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                return int(round(parsed.timestamp() * 1000))
+
+            # Numeric format (epoch milliseconds)
+            elif isinstance(timestamp, (int, float)):
+                return int(timestamp)
+
+        except Exception:
+            return None
+
+        return None
+
+    def parse_weight(self, weight_info: Any) -> float:
+        """Package weight in kilograms"""
+        if not weight_info:
+            return DEFAULT_VALUES['weight_kg']
+
+        try:
+            if isinstance(weight_info, dict):
+                weight = weight_info.get('value', 0)
+                unit = weight_info.get('units', '').lower()
+                return weight * WEIGHT_CONVERSIONS.get(unit, 1.0)
+            elif isinstance(weight_info, (int, float)):
+                return float(weight_info)
+        except Exception:
+            pass
+
+        return DEFAULT_VALUES['weight_kg']
+
+    def categorize_event(self, event_type: str, description: str) -> str:
+        """
+        Categorize an event by keyword, memoized per (type, description)
+        """
+        key = (event_type, description)
+        category = self._category_cache.get(key)
+        if category is None:
+            text = (str(event_type) + ' ' + str(description)).upper()
+            category = next(
+                (name for name, keywords in self.event_categories.items()
+                 if any(keyword in text for keyword in keywords)),
+                'other'
+            )
+            self._category_cache[key] = category
+        return category
+
+    def is_express(self, service_type: Any) -> bool:
+        """Whether a service type is an express service"""
+        return self.classifiers.is_express(service_type)
+
+    def is_facility_location(self, arrival_location: Any) -> bool:
+        """Whether an arrival location denotes a carrier facility"""
+        return self.classifiers.is_facility_location(arrival_location)
+
+    def _tag(self, shipment: Dict[str, Any]) -> Dict[str, Any]:
+        shipment['carrierAdapter'] = self.name
+        return shipment
+
+
+class FedExAdapter(CarrierAdapter):
+    """
+    FedEx track API responses ({"trackDetails": [...]})
+    """
+
+    name = 'fedex'
+    carrier_codes = tuple(CARRIER_MAPPINGS)
+    event_categories = {
+        'pickup': ['PU', 'PICKUP', 'PICKED UP'],
+        'delivery': ['DL', 'DELIVERED'],
+        'out_for_delivery': ['OD', 'ON FEDEX VEHICLE FOR DELIVERY'],
+        'in_transit': ['IT', 'IN TRANSIT'],
+        'arrival': ['AR', 'AT LOCAL FEDEX FACILITY', 'ARRIVED AT'],
+        'departure': ['DP', 'LEFT FEDEX', 'DEPARTED'],
+        'other': ['OC', 'SHIPMENT INFORMATION SENT']  # OC = Order Created
+    }
+    facility_keywords = FACILITY_KEYWORDS
+    express_services = EXPRESS_SERVICES
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        return isinstance(record, dict) and 'trackDetails' in record
+
+    def normalize_address(self, address: Any) -> Dict[str, str]:
+        """FedEx address (city, stateOrProvinceCode, postalCode)"""
+        if not address or not isinstance(address, dict):
+            return dict(UNKNOWN_ADDRESS)
+
+        return {
+            'city': address.get('city', 'UNKNOWN'),
+            'state': address.get('stateOrProvinceCode', 'UNKNOWN'),
+            'postal_code': address.get('postalCode', 'UNKNOWN')
+        }
+
+    def parse_timestamp(self, timestamp: Any) -> Optional[int]:
+        """FedEx timestamps come as MongoDB {"$numberLong": "<epoch ms>"}"""
+        if isinstance(timestamp, dict) and '$numberLong' in timestamp:
+            try:
+                return int(timestamp['$numberLong'])
+            except (TypeError, ValueError):
+                return None
+        return super().parse_timestamp(timestamp)
+
+    def extract_shipments(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        shipments = []
+
+        for track_detail in record.get('trackDetails') or []:
+            # Transform to our expected format
+            shipment = {
+                'trackingNumber': track_detail.get('trackingNumber'),
+                'carrierCode': track_detail.get('carrierCode'),
+                'service': track_detail.get('service', {}),
+                'package': {
+                    'weight': track_detail.get('packageWeight', {}),
+                    'packagingType': track_detail.get('packaging', {}).get('type', 'UNKNOWN')
+                },
+                'origin': {
+                    'address': track_detail.get('shipperAddress', {})
+                },
+                'destination': {
+                    'address': track_detail.get('destinationAddress', {})
+                },
+                'events': track_detail.get('events', []),
+                'deliveryLocationType': track_detail.get('deliveryLocationType', 'UNKNOWN')
+            }
+            shipments.append(self._tag(shipment))
+
+        return shipments
+
+
+class NormalizedAdapter(CarrierAdapter):
+    """
+    Records already in the normalized shipment layout (any carrier), with
+    normalized addresses/timestamps and the generic EVENT_CATEGORIES,
+    FACILITY_KEYWORDS and EXPRESS_SERVICES vocabularies
+    """
+
+    name = 'normalized'
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        return isinstance(record, dict) and 'trackingNumber' in record and 'events' in record
+
+    def extract_shipments(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [self._tag(dict(record))]
+
+
+class CarrierRegistry:
+    """
+    Routes raw records and normalized shipments to their carrier adapter
+    """
+
+    def __init__(self, adapters: Optional[List[CarrierAdapter]] = None):
+        self.adapters: Dict[str, CarrierAdapter] = {}
+        for adapter in adapters or []:
+            self.register(adapter)
+
+    def register(self, adapter: CarrierAdapter) -> None:
+        """Register an adapter; earlier registrations win when several match"""
+        self.adapters[adapter.name] = adapter
+
+    def resolve(self, record: Dict[str, Any]) -> Optional[CarrierAdapter]:
+        """Adapter for a raw input record, or None if no adapter matches"""
+        for adapter in self.adapters.values():
+            if adapter.matches(record):
+                return adapter
+        return None
+
+    def for_shipment(self, shipment: Dict[str, Any]) -> CarrierAdapter:
+        """
+        Adapter for an extracted shipment: by the tag set during extraction,
+        then by carrier code, falling back to the first registered adapter
+        """
+        adapter = self.adapters.get(shipment.get('carrierAdapter'))
+        if adapter:
+            return adapter
+
+        carrier_code = shipment.get('carrierCode')
+        for candidate in self.adapters.values():
+            if carrier_code in candidate.carrier_codes:
+                return candidate
+
+        return next(iter(self.adapters.values()))
+
+
+def default_registry(rules_file: Optional[str] = None) -> CarrierRegistry:
+    """
+    Registry with the built-in adapters
+    """
+    return CarrierRegistry([FedExAdapter(rules_file), NormalizedAdapter(rules_file)])
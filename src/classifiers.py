@@ -0,0 +1,100 @@
+"""
+Precompiled, memoized facility and express-service classifiers
+"""
+import json
+import os
+import re
+from typing import List, Dict, Any, Optional
+
+from config.constants import FACILITY_KEYWORDS, EXPRESS_SERVICES, CLASSIFICATION_RULES_FILE
+
+
+def load_classification_rules(file_path: Optional[str] = None,
+                              facility_keywords: Optional[List[str]] = None,
+                              express_services: Optional[List[str]] = None,
+                              carrier: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Load facility/express vocabularies: the given base lists (built-in FedEx
+    defaults when omitted) plus any entries from a JSON rules file
+
+        {"facility_keywords": [...], "express_services": [...],
+         "carriers": {"<adapter name>": {"facility_keywords": [...], ...}}}
+
+    Top-level entries apply to every carrier, entries under "carriers" only
+    to the named one.
+    """
+    rules = {
+        'facility_keywords': list(FACILITY_KEYWORDS if facility_keywords is None else facility_keywords),
+        'express_services': list(EXPRESS_SERVICES if express_services is None else express_services)
+    }
+
+    file_path = file_path or CLASSIFICATION_RULES_FILE
+    if not file_path or not os.path.exists(file_path):
+        return rules
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        extra_rules = json.load(file)
+
+    sections = [extra_rules]
+    if carrier:
+        sections.append(extra_rules.get('carriers', {}).get(carrier, {}))
+
+    for section in sections:
+        for key in rules:
+            for keyword in section.get(key, []):
+                keyword = str(keyword).upper()
+                if keyword not in rules[key]:
+                    rules[key].append(keyword)
+
+    return rules
+
+
+class KeywordClassifier:
+    """
+    Substring matcher compiled into a single regex, memoized per distinct value
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = [str(k).upper() for k in keywords if k]
+        self.pattern = (
+            re.compile('|'.join(re.escape(k) for k in self.keywords)) if self.keywords else None
+        )
+        self._cache: Dict[str, bool] = {}
+
+    def matches(self, value: Any) -> bool:
+        """True if any keyword occurs in the upper-cased value"""
+        key = str(value or '')
+        result = self._cache.get(key)
+        if result is None:
+            result = bool(self.pattern and self.pattern.search(key.upper()))
+            self._cache[key] = result
+        return result
+
+
+class ShipmentClassifiers:
+    """
+    Facility and express-service classifiers built from one rule set
+    """
+
+    def __init__(self, rules_file: Optional[str] = None,
+                 facility_keywords: Optional[List[str]] = None,
+                 express_services: Optional[List[str]] = None,
+                 carrier: Optional[str] = None):
+        rules = load_classification_rules(rules_file, facility_keywords, express_services, carrier)
+        self.facility = KeywordClassifier(rules['facility_keywords'])
+        self.express = KeywordClassifier(rules['express_services'])
+
+    def is_facility_location(self, arrival_location: Any) -> bool:
+        """Whether an arrivalLocation denotes a carrier facility"""
+        return self.facility.matches(arrival_location)
+
+    def is_facility_event(self, event: Dict[str, Any]) -> bool:
+        """Use the flag set by DataProcessor when present, otherwise classify"""
+        flag = event.get('is_facility')
+        if flag is None:
+            flag = self.is_facility_location(event.get('arrival_location', ''))
+        return flag
+
+    def is_express(self, service_type: Any) -> bool:
+        """Whether a service type is an express service"""
+        return self.express.matches(service_type)
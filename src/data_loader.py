@@ -3,21 +3,24 @@ Data loading and validation functionality for FedEx tracking data
 """
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+from src.carriers import CarrierRegistry, default_registry
 
 
 class DataLoader:
     """
-    Handles loading of FedEx tracking data from JSON files
+    Handles loading of carrier tracking data from JSON files
     """
     
-    def __init__(self):
+    def __init__(self, registry: Optional[CarrierRegistry] = None):
+        self.registry = registry or default_registry()
         self.data = None
+        self.sample = None
         self.validation_report = {}
     
     def load_data(self, file_path: str) -> bool:
         """
-        Load JSON data from file and extract trackDetails
+        Load JSON data from file and extract shipments via carrier adapters
         """
         try:
             print(f"📥 Loading data from: {file_path}")
@@ -29,7 +32,7 @@ class DataLoader:
             with open(file_path, 'r', encoding='utf-8') as file:
                 raw_data = json.load(file)
             
-            # Extract trackDetails from each entry
+            # Extract shipments from each entry
             self.data = self._extract_shipments(raw_data)
             
             if not self._validate_data():
@@ -45,34 +48,60 @@ class DataLoader:
             print(f"❌ Error loading data: {e}")
             return False
     
+    def iter_shipments(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield extracted shipments one at a time without keeping them in self.data
+        
+        The JSON document is still parsed in one go (no streaming parser in the
+        stdlib), but raw entries are released as soon as they are extracted.
+        Validation counters are collected along the way and stored in
+        self.validation_report once the file is exhausted.
+        """
+        print(f"📥 Streaming data from: {file_path}")
+        
+        with open(file_path, 'r', encoding='utf-8') as file:
+            raw_data = json.load(file)
+        
+        if not isinstance(raw_data, list):
+            raise ValueError("Invalid data format: Expected list of records")
+        
+        raw_data.reverse()
+        unmatched = 0
+        counters = self._new_validation_counters()
+        
+        while raw_data:
+            entry = raw_data.pop()
+            adapter = self.registry.resolve(entry)
+            if adapter is None:
+                unmatched += 1
+                continue
+            for shipment in adapter.extract_shipments(entry):
+                if self.sample is None:
+                    self.sample = shipment
+                self._count_shipment(counters, shipment)
+                yield shipment
+        
+        self.validation_report = self._build_validation_report(counters)
+        self.validation_report['unmatched_records'] = unmatched
+        if unmatched:
+            print(f"⚠️  Skipped {unmatched} records with no matching carrier adapter")
+    
     def _extract_shipments(self, raw_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Extract shipment data from FedEx tracking response format
+        Route each raw record to its carrier adapter and extract shipments
         """
         shipments = []
+        unmatched = 0
         
         for entry in raw_data:
-            if 'trackDetails' in entry and entry['trackDetails']:
-                for track_detail in entry['trackDetails']:
-                    # Transform to our expected format
-                    shipment = {
-                        'trackingNumber': track_detail.get('trackingNumber'),
-                        'carrierCode': track_detail.get('carrierCode'),
-                        'service': track_detail.get('service', {}),
-                        'package': {
-                            'weight': track_detail.get('packageWeight', {}),
-                            'packagingType': track_detail.get('packaging', {}).get('type', 'UNKNOWN')
-                        },
-                        'origin': {
-                            'address': track_detail.get('shipperAddress', {})
-                        },
-                        'destination': {
-                            'address': track_detail.get('destinationAddress', {})
-                        },
-                        'events': track_detail.get('events', []),
-                        'deliveryLocationType': track_detail.get('deliveryLocationType', 'UNKNOWN')
-                    }
-                    shipments.append(shipment)
+            adapter = self.registry.resolve(entry)
+            if adapter is None:
+                unmatched += 1
+                continue
+            shipments.extend(adapter.extract_shipments(entry))
+        
+        if unmatched:
+            print(f"⚠️  Skipped {unmatched} records with no matching carrier adapter")
         
         return shipments
     
@@ -85,48 +114,69 @@ class DataLoader:
             return False
         
         # Basic validation
-        valid_shipments = 0
-        total_events = 0
-        unique_event_types = set()
-        
+        counters = self._new_validation_counters()
         for shipment in self.data:
-            if isinstance(shipment, dict) and shipment.get('events'):
-                valid_shipments += 1
-                total_events += len(shipment['events'])
-                
-                # Collect event types
-                for event in shipment['events']:
-                    if event.get('eventType'):
-                        unique_event_types.add(event['eventType'])
-        
-        self.validation_report = {
-            'total_shipments': len(self.data),
-            'valid_shipments': valid_shipments,
-            'total_events': total_events,
-            'unique_event_types': list(unique_event_types)
+            self._count_shipment(counters, shipment)
+        
+        self.validation_report = self._build_validation_report(counters)
+        self.print_validation_report()
+        
+        return self.validation_report['valid_shipments'] > 0
+    
+    def _new_validation_counters(self) -> Dict[str, Any]:
+        return {
+            'total_shipments': 0,
+            'valid_shipments': 0,
+            'total_events': 0,
+            'unique_event_types': set(),
+            'shipments_by_adapter': {}
         }
+    
+    def _count_shipment(self, counters: Dict[str, Any], shipment: Any) -> None:
+        """
+        Add one extracted shipment to the validation counters
+        """
+        counters['total_shipments'] += 1
         
-        print(f"📊 Validation Report:")
-        print(f"   • Total shipments: {len(self.data)}")
-        print(f"   • Valid shipments: {valid_shipments}")
-        print(f"   • Total events: {total_events}")
-        print(f"   • Event types: {list(unique_event_types)}")
+        adapter_name = shipment.get('carrierAdapter', 'unknown') if isinstance(shipment, dict) else 'unknown'
+        by_adapter = counters['shipments_by_adapter']
+        by_adapter[adapter_name] = by_adapter.get(adapter_name, 0) + 1
         
-        return valid_shipments > 0
+        if isinstance(shipment, dict) and shipment.get('events'):
+            counters['valid_shipments'] += 1
+            counters['total_events'] += len(shipment['events'])
+            
+            # Collect event types
+            for event in shipment['events']:
+                if event.get('eventType'):
+                    counters['unique_event_types'].add(event['eventType'])
+    
+    def _build_validation_report(self, counters: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(counters, unique_event_types=list(counters['unique_event_types']))
+    
+    def print_validation_report(self) -> None:
+        """Print the latest validation report"""
+        report = self.validation_report
+        print(f"📊 Validation Report:")
+        print(f"   • Total shipments: {report.get('total_shipments', 0)}")
+        print(f"   • Valid shipments: {report.get('valid_shipments', 0)}")
+        print(f"   • Total events: {report.get('total_events', 0)}")
+        print(f"   • Event types: {report.get('unique_event_types', [])}")
+        print(f"   • Carrier adapters: {report.get('shipments_by_adapter', {})}")
     
     def get_data(self) -> List[Dict[str, Any]]:
         """Get loaded data"""
         return self.data or []
     
     def explore_sample(self) -> None:
-        """Explore sample data structure"""
-        if not self.data:
+        """Explore sample data structure (first loaded or streamed shipment)"""
+        sample = self.data[0] if self.data else self.sample
+        if not sample:
             return
         
         print(f"\n🔍 Sample Data Structure:")
         print("-" * 40)
         
-        sample = self.data[0]
         print(f"Tracking: {sample.get('trackingNumber', 'N/A')}")
         print(f"Service: {sample.get('service', {}).get('type', 'N/A')}")
         print(f"Carrier: {sample.get('carrierCode', 'N/A')}")
@@ -1,19 +1,24 @@
 """
-Data processing and flattening functionality for FedEx data
+Data processing and flattening functionality for carrier tracking data
 """
-import re
-from datetime import datetime
 from typing import List, Dict, Any, Optional
-from config.constants import EVENT_CATEGORIES, WEIGHT_CONVERSIONS, DEFAULT_VALUES
+from src.carriers import CarrierAdapter, CarrierRegistry, default_registry
+from src.sketches import NetworkSketches
+
+# Sort key for events without a timestamp (ordered first)
+MISSING_TIMESTAMP = -(2 ** 63)
 
 
 class DataProcessor:
     """
-    Processes nested FedEx JSON data into flat structure
+    Processes nested carrier JSON data into flat structure
     """
     
-    def __init__(self):
+    def __init__(self, rules_file: Optional[str] = None, registry: Optional[CarrierRegistry] = None):
         self.flattened_data = []
+        self.registry = registry or default_registry(rules_file)
+        self.sketches = NetworkSketches()
+        self.processing_stats = {'duplicate_events_dropped': 0, 'sorts_skipped': 0}
     
     def process_shipments(self, shipments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -21,24 +26,37 @@ class DataProcessor:
         """
         print(f"\n🔄 Processing {len(shipments)} shipments...")
         
-        processed_count = 0
+        processed = self.process_batch(shipments)
+        self.flattened_data.extend(processed)
+        
+        print(f"✅ Processed {len(processed)} shipments successfully")
+        print(f"   🧹 Duplicate events dropped: {self.processing_stats['duplicate_events_dropped']}")
+        print(f"   ⏩ Event sorts skipped (already ordered): {self.processing_stats['sorts_skipped']}")
+        return self.flattened_data
+    
+    def process_batch(self, shipments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process a batch of shipments without retaining them (pipeline stage)
+        """
+        processed = []
         for shipment in shipments:
             try:
                 flattened = self._process_shipment(shipment)
                 if flattened:
-                    self.flattened_data.append(flattened)
-                    processed_count += 1
+                    processed.append(flattened)
+                    self.sketches.observe_shipment(flattened)
             except Exception as e:
                 print(f"⚠️  Failed to process shipment: {e}")
                 continue
         
-        print(f"✅ Processed {processed_count} shipments successfully")
-        return self.flattened_data
+        return processed
     
     def _process_shipment(self, shipment: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Process a single FedEx shipment
+        Process a single shipment with its carrier adapter
         """
+        adapter = self.registry.for_shipment(shipment)
+        
         # Basic info
         tracking_number = shipment.get('trackingNumber', 'UNKNOWN')
         carrier_code = shipment.get('carrierCode', 'UNKNOWN')
@@ -50,19 +68,19 @@ class DataProcessor:
         
         # Package info
         package_info = shipment.get('package', {})
-        weight_kg = self._extract_weight(package_info.get('weight', {}))
+        weight_kg = adapter.parse_weight(package_info.get('weight', {}))
         packaging_type = package_info.get('packagingType', 'UNKNOWN')
         
-        # Location info - handle FedEx address format
+        # Location info - address format is carrier-specific
         origin_info = shipment.get('origin', {})
         dest_info = shipment.get('destination', {})
         
-        origin_addr = self._extract_fedex_address(origin_info.get('address', {}))
-        dest_addr = self._extract_fedex_address(dest_info.get('address', {}))
+        origin_addr = adapter.normalize_address(origin_info.get('address', {}))
+        dest_addr = adapter.normalize_address(dest_info.get('address', {}))
         
         # Process events
         events = shipment.get('events', [])
-        processed_events = self._process_events(events)
+        processed_events = self._process_events(events, adapter)
         
         return {
             'tracking_number': tracking_number,
@@ -78,19 +96,39 @@ class DataProcessor:
             'destination_state': dest_addr['state'],
             'destination_pincode': dest_addr['postal_code'],
             'events': processed_events,
-            'delivery_location_type': shipment.get('deliveryLocationType', 'UNKNOWN')
+            'delivery_location_type': shipment.get('deliveryLocationType', 'UNKNOWN'),
+            'carrier_adapter': adapter.name,
+            'is_express_service': adapter.is_express(service_type)
         }
     
-    def _process_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _process_events(self, events: List[Dict[str, Any]],
+                        adapter: Optional[CarrierAdapter] = None) -> List[Dict[str, Any]]:
         """
         Process events for a shipment
         """
+        adapter = adapter or self.registry.for_shipment({})
         processed_events = []
+        seen = set()
+        ascending = True
+        descending = True
+        previous = None
         
         for event in events:
             try:
-                timestamp = self._parse_timestamp(event.get('timestamp'))
-                address = self._extract_fedex_address(event.get('address', {}))
+                timestamp = adapter.parse_timestamp(event.get('timestamp'))
+                address = adapter.normalize_address(event.get('address', {}))
+                
+                # Drop duplicate/replayed scans
+                dedup_key = (
+                    event.get('eventType', ''),
+                    timestamp,
+                    address['postal_code'],
+                    event.get('arrivalLocation', '')
+                )
+                if dedup_key in seen:
+                    self.processing_stats['duplicate_events_dropped'] += 1
+                    continue
+                seen.add(dedup_key)
                 
                 processed_event = {
                     'event_type': event.get('eventType', ''),
@@ -100,111 +138,48 @@ class DataProcessor:
                     'state': address['state'],
                     'postal_code': address['postal_code'],
                     'arrival_location': event.get('arrivalLocation', ''),
-                    'category': self._categorize_event(
+                    'is_facility': adapter.is_facility_location(event.get('arrivalLocation', '')),
+                    'category': adapter.categorize_event(
                         event.get('eventType', ''), 
                         event.get('eventDescription', '')
                     )
                 }
                 processed_events.append(processed_event)
+                
+                # Track ordering in the same pass so the sort can be skipped
+                sort_key = timestamp if timestamp is not None else MISSING_TIMESTAMP
+                if previous is not None:
+                    ascending = ascending and previous <= sort_key
+                    descending = descending and previous > sort_key
+                previous = sort_key
             except Exception:
                 continue
         
-        # Sort by timestamp (most recent first for FedEx data)
-        processed_events.sort(key=lambda x: x['timestamp'] or datetime.min, reverse=False)
+        # Zero or one event never needs ordering (not counted as a skipped sort)
+        if len(processed_events) < 2:
+            return processed_events
+        
+        # Order by timestamp ascending (FedEx lists most recent first)
+        if ascending:
+            self.processing_stats['sorts_skipped'] += 1
+        elif descending:
+            # Strictly descending: reversing equals a stable sort
+            processed_events.reverse()
+            self.processing_stats['sorts_skipped'] += 1
+        else:
+            processed_events.sort(
+                key=lambda x: x['timestamp'] if x['timestamp'] is not None else MISSING_TIMESTAMP
+            )
         return processed_events
     
-    def _parse_timestamp(self, timestamp: Any) -> Optional[datetime]:
-        """
-        Parse timestamp from FedEx format ($numberLong)
-        """
-        if not timestamp:
-            return None
-        
-        try:
-            # Handle MongoDB $numberLong format (FedEx uses this)
-            if isinstance(timestamp, dict) and '$numberLong' in timestamp:
-                ts_ms = int(timestamp['$numberLong'])
-                return datetime.fromtimestamp(ts_ms / 1000.0)
-            
-            # Handle string format as fallback
-            elif isinstance(timestamp, str):
-                # Clean the string
-                ts_clean = re.sub(r'[+-]\d{2}:\d{2}$', '', timestamp)
-                ts_clean = ts_clean.replace('Z', '').replace('T', ' ')
-                
-                # Try formats
-                for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f']:
-                    try:
-                        return datetime.strptime(ts_clean, fmt)
-                    except ValueError:
-                        continue
-                
-                return datetime.fromisoformat(ts_clean)
-            
-            # Numeric format
-            elif isinstance(timestamp, (int, float)):
-                return datetime.fromtimestamp(timestamp / 1000.0)
-                
-        except Exception:
-            return None
-        
-        return None
-    
-    def _extract_weight(self, weight_info: Any) -> float:
-        """
-        Extract weight in kg from FedEx format
-        """
-        if not weight_info:
-            return DEFAULT_VALUES['weight_kg']
-        
-        try:
-            if isinstance(weight_info, dict):
-                weight = weight_info.get('value', 0)
-                unit = weight_info.get('units', '').lower()
-                return weight * WEIGHT_CONVERSIONS.get(unit, 1.0)
-            elif isinstance(weight_info, (int, float)):
-                return float(weight_info)
-        except Exception:
-            pass
-        
-        return DEFAULT_VALUES['weight_kg']
-    
-    def _extract_fedex_address(self, address: Any) -> Dict[str, str]:
-        """
-        Extract address components from FedEx format
-        """
-        if not address or not isinstance(address, dict):
-            return {'city': 'UNKNOWN', 'state': 'UNKNOWN', 'postal_code': 'UNKNOWN'}
-        
-        return {
-            'city': address.get('city', 'UNKNOWN'),
-            'state': address.get('stateOrProvinceCode', 'UNKNOWN'),
-            'postal_code': address.get('postalCode', 'UNKNOWN')
-        }
-    
-    def _categorize_event(self, event_type: str, description: str) -> str:
-        """
-        Categorize FedEx event types
-        """
-        text = (str(event_type) + ' ' + str(description)).upper()
-        
-        # FedEx specific event mappings
-        fedex_categories = {
-            'pickup': ['PU', 'PICKUP', 'PICKED UP'],
-            'delivery': ['DL', 'DELIVERED'],
-            'out_for_delivery': ['OD', 'ON FEDEX VEHICLE FOR DELIVERY'],
-            'in_transit': ['IT', 'IN TRANSIT'],
-            'arrival': ['AR', 'AT LOCAL FEDEX FACILITY', 'ARRIVED AT'],
-            'departure': ['DP', 'LEFT FEDEX', 'DEPARTED'],
-            'other': ['OC', 'SHIPMENT INFORMATION SENT']  # OC = Order Created
-        }
-        
-        for category, keywords in fedex_categories.items():
-            if any(keyword in text for keyword in keywords):
-                return category
-        
-        return 'other'
-    
     def get_flattened_data(self) -> List[Dict[str, Any]]:
         """Get processed data"""
-        return self.flattened_data
\ No newline at end of file
+        return self.flattened_data
+    
+    def get_processing_stats(self) -> Dict[str, int]:
+        """Get deduplication and ordering statistics"""
+        return self.processing_stats
+    
+    def get_sketches(self) -> NetworkSketches:
+        """Get network-wide sketches"""
+        return self.sketches
\ No newline at end of file
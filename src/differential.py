@@ -0,0 +1,318 @@
+"""
+Differential regression harness comparing processing/metrics engines
+
+Runs a baseline engine and one or more candidate engines on the same input
+(data/shipment_data.json or a synthetic corpus built from it) with a fixed
+in-flight as-of time, compares the full metric records and the detailed
+output per tracking_number and column and the summary output per metric,
+and records the speedup of each candidate over the baseline.
+
+    python -m src.differential --engines fused pipeline --synthetic 20000
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Dict, Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data_loader import DataLoader
+from src.data_processor import DataProcessor
+from src.metrics_calculator import MetricsCalculator
+from src.output_generator import OutputGenerator
+from src.pipeline import PipelineScheduler
+
+# Fixed in-flight reference time (UTC epoch ms) so runs are reproducible
+DEFAULT_AS_OF = 1767225600000  # 2026-01-01T00:00:00Z
+
+# Compared outputs: raw metric records, detailed CSV table, summary CSV table
+OUTPUTS = ('records', 'detailed', 'summary')
+
+
+def _run_batch_engine(metrics_engine: str) -> Callable[[List[Dict[str, Any]], Optional[int]], Dict[str, Any]]:
+    def run(shipments: List[Dict[str, Any]], as_of: Optional[int]) -> Dict[str, Any]:
+        processor = DataProcessor()
+        calculator = MetricsCalculator(engine=metrics_engine, as_of=as_of)
+        metrics = calculator.calculate_metrics(processor.process_shipments(shipments))
+        return {'metrics': metrics, 'sketches': processor.get_sketches(),
+                'processing_stats': processor.get_processing_stats()}
+    return run
+
+
+def _run_pipeline_engine(shipments: List[Dict[str, Any]], as_of: Optional[int]) -> Dict[str, Any]:
+    processor = DataProcessor()
+    calculator = MetricsCalculator(engine='fused', as_of=as_of)
+    metrics = []
+    PipelineScheduler().run(
+        iter(shipments),
+        [('process', processor.process_batch), ('metrics', calculator.calculate_batch)],
+        metrics.extend
+    )
+    return {'metrics': metrics, 'sketches': processor.get_sketches(),
+            'processing_stats': processor.get_processing_stats()}
+
+
+# Engine name -> callable(extracted shipments, as_of) -> {'metrics', 'sketches', 'processing_stats'}
+ENGINES: Dict[str, Callable[[List[Dict[str, Any]], Optional[int]], Dict[str, Any]]] = {
+    'legacy': _run_batch_engine('legacy'),
+    'fused': _run_batch_engine('fused'),
+    'pipeline': _run_pipeline_engine
+}
+
+
+def synthetic_corpus(raw_records: List[Dict[str, Any]], size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Build `size` FedEx-format shipments by cloning real ones with fresh
+    tracking numbers, shifted timestamps, shuffled event order and replayed
+    scans; some are cut short (latest scans dropped) to stay in flight
+    """
+    rng = random.Random(seed)
+    templates = [
+        (record, detail)
+        for record in raw_records
+        for detail in record.get('trackDetails') or []
+    ]
+    if not templates:
+        return []
+
+    corpus = []
+    for i in range(size):
+        record, detail = templates[i % len(templates)]
+        detail = copy.deepcopy(detail)
+        detail['trackingNumber'] = f"SYN{i:09d}"
+
+        shift_ms = rng.randint(0, 365 * 24 * 3600) * 1000
+        for event in detail.get('events', []):
+            timestamp = event.get('timestamp')
+            if isinstance(timestamp, dict) and '$numberLong' in timestamp:
+                timestamp['$numberLong'] = str(int(timestamp['$numberLong']) + shift_ms)
+
+        events = detail.get('events', [])
+        if len(events) > 1 and rng.random() < 0.1:
+            # FedEx lists the latest scan first: drop the newest ones
+            del events[:rng.randint(1, len(events) - 1)]
+        if events and rng.random() < 0.2:
+            events.append(copy.deepcopy(rng.choice(events)))
+        if rng.random() < 0.2:
+            rng.shuffle(events)
+
+        entry = {key: value for key, value in record.items() if key != 'trackDetails'}
+        entry['trackDetails'] = [detail]
+        corpus.append(entry)
+
+    return corpus
+
+
+def _plain(value: Any) -> Any:
+    """Unwrap numpy scalars for readable reports and JSON"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# Index level numbering repeated keys (0 for the first occurrence)
+_OCCURRENCE = '_occurrence'
+
+
+def _keyed(frame: pd.DataFrame, key_columns: List[str]) -> pd.DataFrame:
+    """Index by `key_columns` plus an occurrence counter so repeated keys stay distinct"""
+    occurrence = frame.groupby(key_columns, sort=False, dropna=False).cumcount()
+    return frame.assign(**{_OCCURRENCE: occurrence.to_numpy()}).set_index(key_columns + [_OCCURRENCE])
+
+
+def _key_label(key: tuple) -> str:
+    *values, occurrence = key
+    label = str(values[0]) if len(values) == 1 else str(tuple(values))
+    return label if occurrence == 0 else f"{label} #{occurrence + 1}"
+
+
+def _duplicate_key_count(frame: pd.DataFrame, key_columns: List[str]) -> int:
+    return int(frame.duplicated(key_columns, keep='first').sum())
+
+
+def compare_frames(baseline: pd.DataFrame, candidate: pd.DataFrame, key_columns: List[str],
+                   rtol: float, atol: float, max_diffs: int) -> Dict[str, Any]:
+    """
+    Compare two tables row-by-row on `key_columns` and column-by-column,
+    numeric columns within rtol/atol
+
+    Repeated keys (e.g. one tracking number from two carriers) are matched
+    by order of occurrence and reported as `key #n`; differing numbers of
+    repeats show up as missing/extra rows.
+    """
+    base = _keyed(baseline, key_columns)
+    cand = _keyed(candidate, key_columns)
+
+    missing = base.index.difference(cand.index)
+    extra = cand.index.difference(base.index)
+    common = base.index.intersection(cand.index)
+    base, cand = base.loc[common], cand.loc[common]
+
+    differences = []
+    diff_count = 0
+    missing_columns = sorted(set(base.columns) ^ set(cand.columns))
+
+    for column in [c for c in base.columns if c in cand.columns]:
+        left, right = base[column], cand[column]
+        left_num = pd.to_numeric(left, errors='coerce')
+        right_num = pd.to_numeric(right, errors='coerce')
+
+        if left_num.notna().eq(left.notna()).all() and right_num.notna().eq(right.notna()).all():
+            equal = np.isclose(left_num.to_numpy(dtype=float), right_num.to_numpy(dtype=float),
+                               rtol=rtol, atol=atol, equal_nan=True)
+        else:
+            # Missing on both sides counts as equal (astype(str) keeps NaN under pandas' string dtype)
+            both_missing = (left.isna() & right.isna()).to_numpy()
+            equal = both_missing | (left.astype(str).to_numpy() == right.astype(str).to_numpy())
+
+        mismatched = np.flatnonzero(~equal)
+        diff_count += len(mismatched)
+        for position in mismatched[:max(0, max_diffs - len(differences))]:
+            differences.append({
+                'key': _key_label(common[position]),
+                'column': column,
+                'baseline': _plain(left.iloc[position]),
+                'candidate': _plain(right.iloc[position])
+            })
+
+    return {
+        'matched': not (len(missing) or len(extra) or diff_count or missing_columns),
+        'rows_compared': len(common),
+        'missing_count': len(missing),
+        'extra_count': len(extra),
+        'missing_rows': [_key_label(k) for k in missing[:max_diffs]],
+        'extra_rows': [_key_label(k) for k in extra[:max_diffs]],
+        'baseline_duplicate_keys': _duplicate_key_count(baseline, key_columns),
+        'candidate_duplicate_keys': _duplicate_key_count(candidate, key_columns),
+        'mismatched_columns': missing_columns,
+        'difference_count': diff_count,
+        'first_differences': differences
+    }
+
+
+def run_differential(shipments: List[Dict[str, Any]], baseline: str, candidates: List[str],
+                     rtol: float = 1e-9, atol: float = 1e-6, max_diffs: int = 10,
+                     as_of: Optional[int] = DEFAULT_AS_OF) -> Dict[str, Any]:
+    """
+    Run the baseline and candidate engines on the same shipments and compare
+    the full metric records, the detailed output and the summary output
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        output_generator = OutputGenerator()
+
+    def execute(name: str) -> Dict[str, Any]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = ENGINES[name](shipments, as_of)
+            elapsed = time.perf_counter() - start
+            records = pd.DataFrame(result['metrics'])
+            detailed = output_generator.build_detailed_frame(result['metrics'])
+            summary = output_generator.build_summary_frame(
+                result['metrics'], result['sketches'], result['processing_stats']
+            )
+        return {'seconds': elapsed, 'records': records, 'detailed': detailed, 'summary': summary}
+
+    reference = execute(baseline)
+    report = {
+        'baseline': baseline,
+        'baseline_seconds': round(reference['seconds'], 4),
+        'shipments': len(shipments),
+        'as_of': as_of,
+        'engines': {}
+    }
+
+    for name in candidates:
+        outcome = execute(name)
+        report['engines'][name] = {
+            'seconds': round(outcome['seconds'], 4),
+            'speedup': round(reference['seconds'] / outcome['seconds'], 3) if outcome['seconds'] else None,
+            'records': compare_frames(reference['records'], outcome['records'],
+                                      ['tracking_number'], rtol, atol, max_diffs),
+            'detailed': compare_frames(reference['detailed'], outcome['detailed'],
+                                       ['tracking_number'], rtol, atol, max_diffs),
+            'summary': compare_frames(reference['summary'], outcome['summary'],
+                                      ['metric_category', 'metric_name'], rtol, atol, max_diffs)
+        }
+
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """
+    Print a differential report
+    """
+    print(f"🔬 Differential run on {report['shipments']:,} shipments, as-of {report['as_of']} "
+          f"(baseline '{report['baseline']}': {report['baseline_seconds']:.2f}s)")
+
+    for name, result in report['engines'].items():
+        status = '✅' if all(result[output_name]['matched'] for output_name in OUTPUTS) else '❌'
+        print(f"\n{status} {name}: {result['seconds']:.2f}s (speedup x{result['speedup']})")
+
+        for output_name in OUTPUTS:
+            comparison = result[output_name]
+            print(f"   {output_name}: {comparison['rows_compared']} rows compared, "
+                  f"{comparison['difference_count']} differing values, "
+                  f"{comparison['missing_count']} missing, {comparison['extra_count']} extra")
+            for key in comparison['missing_rows']:
+                print(f"      missing: {key}")
+            for key in comparison['extra_rows']:
+                print(f"      extra: {key}")
+            if comparison['baseline_duplicate_keys'] or comparison['candidate_duplicate_keys']:
+                print(f"      repeated keys: {comparison['baseline_duplicate_keys']} baseline, "
+                      f"{comparison['candidate_duplicate_keys']} candidate (matched by occurrence)")
+            if comparison['mismatched_columns']:
+                print(f"      columns only on one side: {comparison['mismatched_columns']}")
+            for diff in comparison['first_differences']:
+                print(f"      {diff['key']} [{diff['column']}]: {diff['baseline']!r} != {diff['candidate']!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare engine outputs against a baseline engine")
+    parser.add_argument('--input', default='data/shipment_data.json', help="FedEx JSON input file")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="Build a synthetic corpus of this many shipments from the input")
+    parser.add_argument('--baseline', default='legacy', choices=sorted(ENGINES))
+    parser.add_argument('--engines', nargs='+', default=['fused', 'pipeline'], choices=sorted(ENGINES))
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    parser.add_argument('--atol', type=float, default=1e-6)
+    parser.add_argument('--max-diffs', type=int, default=10)
+    parser.add_argument('--as-of', type=int, default=DEFAULT_AS_OF,
+                        help="In-flight reference time in UTC epoch ms (default 2026-01-01T00:00:00Z)")
+    parser.add_argument('--report', default='output/differential_report.json',
+                        help="Where to record the JSON report ('' to skip)")
+    args = parser.parse_args(argv)
+
+    with open(args.input, 'r', encoding='utf-8') as file:
+        raw_records = json.load(file)
+
+    if args.synthetic:
+        raw_records = synthetic_corpus(raw_records, args.synthetic)
+
+    loader = DataLoader()
+    with contextlib.redirect_stdout(io.StringIO()):
+        shipments = loader._extract_shipments(raw_records)
+
+    report = run_differential(shipments, args.baseline, args.engines,
+                              args.rtol, args.atol, args.max_diffs, args.as_of)
+    print_report(report)
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, default=str)
+        print(f"\n📄 Report -> {args.report}")
+
+    all_matched = all(
+        all(result[output_name]['matched'] for output_name in OUTPUTS)
+        for result in report['engines'].values()
+    )
+    return 0 if all_matched else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
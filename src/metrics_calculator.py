@@ -1,8 +1,11 @@
 """
 Transit performance metrics calculation
 """
-from typing import List, Dict, Any
-from config.constants import FACILITY_KEYWORDS, EXPRESS_SERVICES
+from typing import List, Dict, Any, Optional
+from src.classifiers import ShipmentClassifiers
+
+# Event timestamps are UTC epoch milliseconds
+MS_PER_HOUR = 3_600_000
 
 
 class MetricsCalculator:
@@ -10,8 +13,21 @@ class MetricsCalculator:
     Calculates transit performance metrics
     """
     
-    def __init__(self):
+    ENGINES = ('fused', 'legacy')
+    
+    def __init__(self, rules_file: Optional[str] = None, engine: str = 'fused',
+                 as_of: Optional[int] = None):
+        """
+        `as_of` (UTC epoch ms) enables in-flight mode: undelivered shipments,
+        including those with a single scan, get open-ended clocks measured
+        against it
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown metrics engine '{engine}', expected one of {self.ENGINES}")
         self.performance_metrics = []
+        self.classifiers = ShipmentClassifiers(rules_file)
+        self.engine = engine
+        self.as_of = as_of
     
     def calculate_metrics(self, flattened_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -19,45 +35,208 @@ class MetricsCalculator:
         """
         print(f"\n📈 Calculating metrics for {len(flattened_data)} shipments...")
         
-        calculated_count = 0
+        calculated = self.calculate_batch(flattened_data)
+        self.performance_metrics.extend(calculated)
+        
+        print(f"✅ Calculated metrics for {len(calculated)} shipments")
+        return self.performance_metrics
+    
+    def calculate_batch(self, flattened_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Calculate metrics for a batch without retaining them (pipeline stage)
+        """
+        calculated = []
         for shipment in flattened_data:
             try:
                 metrics = self._calculate_shipment_metrics(shipment)
                 if metrics:
-                    self.performance_metrics.append(metrics)
-                    calculated_count += 1
+                    calculated.append(metrics)
             except Exception as e:
                 print(f"⚠️  Failed to calculate metrics: {e}")
                 continue
         
-        print(f"✅ Calculated metrics for {calculated_count} shipments")
-        return self.performance_metrics
+        return calculated
     
     def _calculate_shipment_metrics(self, shipment: Dict[str, Any]) -> Dict[str, Any]:
         """
         Calculate metrics for a single shipment
         """
-        events = shipment['events']
-        valid_events = [e for e in events if e.get('timestamp')]
+        if self.engine == 'fused':
+            event_metrics = self._calculate_event_metrics_fused(shipment['events'])
+        else:
+            event_metrics = self._calculate_event_metrics_legacy(shipment['events'])
+        
+        if event_metrics is None:
+            return None
+        
+        return self._build_metrics(shipment, event_metrics)
+    
+    def _calculate_event_metrics_fused(self, events: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Single-pass kernel: walks the timestamp-sorted events once and
+        accumulates every event-derived metric
+        """
+        event_count = 0
+        in_transit_events = 0
+        attempts = 0
+        pickup_time = None
+        delivery_time = None
+        facility_events = 0
+        first_facility_time = None
+        last_facility_time = None
+        first_scan_time = None
+        previous_time = None
+        max_scan_gap = 0
+        current_facility = None
+        unique_facilities = set()
+        is_facility_event = self.classifiers.is_facility_event
+        
+        for event in events:
+            timestamp = event.get('timestamp')
+            if timestamp is None:
+                continue
+            event_count += 1
+            if previous_time is None:
+                first_scan_time = timestamp
+            elif timestamp - previous_time > max_scan_gap:
+                max_scan_gap = timestamp - previous_time
+            previous_time = timestamp
+            
+            category = event.get('category')
+            if category == 'in_transit':
+                in_transit_events += 1
+            elif category == 'out_for_delivery':
+                attempts += 1
+            elif category == 'pickup':
+                if pickup_time is None:
+                    pickup_time = timestamp
+            elif category == 'delivery':
+                delivery_time = timestamp
+            
+            if is_facility_event(event):
+                facility_events += 1
+                if first_facility_time is None or timestamp < first_facility_time:
+                    first_facility_time = timestamp
+                if last_facility_time is None or timestamp > last_facility_time:
+                    last_facility_time = timestamp
+                key = f"{event.get('city')}_{event.get('state')}_{event.get('postal_code')}"
+                if key.strip('_'):
+                    unique_facilities.add(key)
+                    current_facility = key
         
-        if len(valid_events) < 2:
+        if not self._has_enough_events(event_count, delivery_time):
             return None
         
-        # Facility metrics
-        facility_metrics = self._calculate_facility_metrics(valid_events)
+        total_hours = 0.0
+        if pickup_time is not None and delivery_time is not None:
+            total_hours = max(0.0, (delivery_time - pickup_time) / MS_PER_HOUR)
         
-        # Time metrics
-        time_metrics = self._calculate_time_metrics(valid_events)
+        inter_facility_hours = 0.0
+        if facility_events >= 2:
+            inter_facility_hours = max(0.0, (last_facility_time - first_facility_time) / MS_PER_HOUR)
         
-        # Service classification
-        is_express = any(
-            express_word in str(shipment['service_type']).upper() 
-            for express_word in EXPRESS_SERVICES
-        )
+        return {
+            'pickup_time': pickup_time,
+            'delivery_time': delivery_time,
+            'total_hours': total_hours,
+            'inter_facility_hours': inter_facility_hours,
+            'max_scan_gap_hours': max_scan_gap / MS_PER_HOUR,
+            'unique_facilities': len(unique_facilities),
+            'in_transit_events': in_transit_events,
+            'attempts': attempts,
+            'first_attempt': attempts <= 1,
+            'event_count': event_count,
+            'first_scan_time': first_scan_time,
+            'last_scan_time': previous_time,
+            'current_facility': current_facility
+        }
+    
+    def _calculate_event_metrics_legacy(self, events: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Multi-pass reference implementation (kept for regression comparison)
+        """
+        valid_events = [e for e in events if e.get('timestamp') is not None]
+        delivery_events = [e for e in valid_events if e.get('category') == 'delivery']
         
-        # Delivery metrics
+        if not self._has_enough_events(len(valid_events), delivery_events[-1]['timestamp'] if delivery_events else None):
+            return None
+        
+        # Classify facility events once, shared by facility and time metrics
+        facility_events = [e for e in valid_events if self.classifiers.is_facility_event(e)]
+        
+        facility_metrics = self._calculate_facility_metrics(valid_events, facility_events)
+        time_metrics = self._calculate_time_metrics(valid_events, facility_events)
         delivery_metrics = self._calculate_delivery_metrics(valid_events)
         
+        facility_keys = [
+            key for key in (f"{e.get('city')}_{e.get('state')}_{e.get('postal_code')}" for e in facility_events)
+            if key.strip('_')
+        ]
+        
+        return {
+            'pickup_time': time_metrics['pickup_time'],
+            'delivery_time': time_metrics['delivery_time'],
+            'total_hours': time_metrics['total_hours'],
+            'inter_facility_hours': time_metrics['inter_facility_hours'],
+            'max_scan_gap_hours': time_metrics['max_scan_gap_hours'],
+            'unique_facilities': facility_metrics['unique_facilities'],
+            'in_transit_events': facility_metrics['in_transit_events'],
+            'attempts': delivery_metrics['attempts'],
+            'first_attempt': delivery_metrics['first_attempt'],
+            'event_count': len(valid_events),
+            'first_scan_time': valid_events[0]['timestamp'],
+            'last_scan_time': valid_events[-1]['timestamp'],
+            'current_facility': facility_keys[-1] if facility_keys else None
+        }
+    
+    def _has_enough_events(self, event_count: int, delivery_time: Optional[int]) -> bool:
+        """
+        Delivered shipments need two timestamped scans; in in-flight mode an
+        undelivered shipment needs only one
+        """
+        if event_count >= 2:
+            return True
+        return event_count == 1 and self.as_of is not None and delivery_time is None
+    
+    def _in_flight_metrics(self, event_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Open-ended clocks for an undelivered shipment against `as_of`
+        (elapsed time starts at pickup, or the first scan if pickup is missing)
+        """
+        if self.as_of is None or event_metrics['delivery_time'] is not None:
+            return {
+                'elapsed_hours_since_pickup': None,
+                'hours_since_last_scan': None,
+                'current_facility': None
+            }
+        
+        started = event_metrics['pickup_time']
+        if started is None:
+            started = event_metrics['first_scan_time']
+        
+        return {
+            'elapsed_hours_since_pickup': round(max(0.0, (self.as_of - started) / MS_PER_HOUR), 2),
+            'hours_since_last_scan': round(max(0.0, (self.as_of - event_metrics['last_scan_time']) / MS_PER_HOUR), 2),
+            'current_facility': event_metrics['current_facility'] or 'UNKNOWN'
+        }
+    
+    def _shipment_status(self, event_metrics: Dict[str, Any]) -> Optional[str]:
+        """
+        'delivered' or 'in_flight' in in-flight mode, None when it is disabled
+        """
+        if self.as_of is None:
+            return None
+        return 'delivered' if event_metrics['delivery_time'] is not None else 'in_flight'
+    
+    def _build_metrics(self, shipment: Dict[str, Any], event_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Combine shipment attributes and event-derived metrics into one record
+        """
+        # Service classification (set by the carrier adapter during processing)
+        is_express = shipment.get('is_express_service')
+        if is_express is None:
+            is_express = self.classifiers.is_express(shipment['service_type'])
+        
         # Build metrics dictionary
         metrics = {
             # Basic info
@@ -76,19 +255,20 @@ class MetricsCalculator:
             'destination_pincode': shipment['destination_pincode'],
             
             # Time metrics
-            'pickup_datetime_ist': time_metrics['pickup_time'],
-            'delivery_datetime_ist': time_metrics['delivery_time'],
-            'total_transit_hours': round(time_metrics['total_hours'], 2),
-            'time_in_inter_facility_transit_hours': round(time_metrics['inter_facility_hours'], 2),
+            'pickup_datetime_ist': event_metrics['pickup_time'],
+            'delivery_datetime_ist': event_metrics['delivery_time'],
+            'total_transit_hours': round(event_metrics['total_hours'], 2),
+            'time_in_inter_facility_transit_hours': round(event_metrics['inter_facility_hours'], 2),
+            'max_scan_gap_hours': round(event_metrics['max_scan_gap_hours'], 2),
             
             # Facility metrics
-            'num_facilities_visited': facility_metrics['unique_facilities'],
-            'num_in_transit_events': facility_metrics['in_transit_events'],
+            'num_facilities_visited': event_metrics['unique_facilities'],
+            'num_in_transit_events': event_metrics['in_transit_events'],
             
             # Velocity metrics
             'avg_hours_per_facility': round(
-                time_metrics['total_hours'] / facility_metrics['unique_facilities'] 
-                if facility_metrics['unique_facilities'] > 0 else 0, 2
+                event_metrics['total_hours'] / event_metrics['unique_facilities'] 
+                if event_metrics['unique_facilities'] > 0 else 0, 2
             ),
             
             # Service classification
@@ -96,25 +276,25 @@ class MetricsCalculator:
             
             # Delivery metrics
             'delivery_location_type': shipment['delivery_location_type'],
-            'num_out_for_delivery_attempts': delivery_metrics['attempts'],
-            'first_attempt_delivery': delivery_metrics['first_attempt'],
+            'num_out_for_delivery_attempts': event_metrics['attempts'],
+            'first_attempt_delivery': event_metrics['first_attempt'],
             
             # Event counts
-            'total_events_count': len(valid_events)
+            'total_events_count': event_metrics['event_count'],
+            
+            # Live status and open-ended clocks (in-flight mode only)
+            'shipment_status': self._shipment_status(event_metrics),
+            'last_scan_datetime_ist': event_metrics['last_scan_time'],
+            **self._in_flight_metrics(event_metrics)
         }
         
         return metrics
     
-    def _calculate_facility_metrics(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _calculate_facility_metrics(self, events: List[Dict[str, Any]],
+                                    facility_events: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Calculate facility-related metrics
         """
-        facility_events = [
-            e for e in events 
-            if any(keyword in str(e.get('arrival_location', '')).upper() 
-                  for keyword in FACILITY_KEYWORDS)
-        ]
-        
         # Unique facilities
         unique_facilities = set()
         for event in facility_events:
@@ -130,7 +310,8 @@ class MetricsCalculator:
             'in_transit_events': in_transit_events
         }
     
-    def _calculate_time_metrics(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _calculate_time_metrics(self, events: List[Dict[str, Any]],
+                                facility_events: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Calculate time-related metrics
         """
@@ -142,30 +323,29 @@ class MetricsCalculator:
         
         # Total transit time
         total_hours = 0.0
-        if pickup_time and delivery_time:
+        if pickup_time is not None and delivery_time is not None:
             delta = delivery_time - pickup_time
-            total_hours = max(0.0, delta.total_seconds() / 3600)
+            total_hours = max(0.0, delta / MS_PER_HOUR)
         
         # Inter-facility time
-        inter_facility_hours = self._calculate_inter_facility_time(events)
+        inter_facility_hours = self._calculate_inter_facility_time(facility_events)
+        
+        # Longest silence between consecutive scans
+        gaps = [b['timestamp'] - a['timestamp'] for a, b in zip(events, events[1:])]
+        max_scan_gap_hours = max([0] + gaps) / MS_PER_HOUR
         
         return {
             'pickup_time': pickup_time,
             'delivery_time': delivery_time,
             'total_hours': total_hours,
-            'inter_facility_hours': inter_facility_hours
+            'inter_facility_hours': inter_facility_hours,
+            'max_scan_gap_hours': max_scan_gap_hours
         }
     
-    def _calculate_inter_facility_time(self, events: List[Dict[str, Any]]) -> float:
+    def _calculate_inter_facility_time(self, facility_events: List[Dict[str, Any]]) -> float:
         """
         Calculate time between facilities
         """
-        facility_events = [
-            e for e in events 
-            if any(keyword in str(e.get('arrival_location', '')).upper() 
-                  for keyword in FACILITY_KEYWORDS)
-        ]
-        
         if len(facility_events) < 2:
             return 0.0
         
@@ -174,7 +354,7 @@ class MetricsCalculator:
         last_time = sorted_events[-1]['timestamp']
         
         delta = last_time - first_time
-        return max(0.0, delta.total_seconds() / 3600)
+        return max(0.0, delta / MS_PER_HOUR)
     
     def _calculate_delivery_metrics(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
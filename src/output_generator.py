@@ -4,7 +4,19 @@ Output generation for CSV files
 import pandas as pd
 import numpy as np
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from config.constants import OUTPUT_TIMEZONE, INFLIGHT_SETTINGS
+from src.sketches import NetworkSketches
+from src.transit_stats import lane_key, percentile_summary_rows, select_percentiles
+
+
+def format_ist(values: pd.Series) -> pd.Series:
+    """
+    UTC epoch ms -> OUTPUT_TIMEZONE strings, one vectorized conversion
+    """
+    epochs = pd.to_numeric(values, errors='coerce')
+    local = pd.to_datetime(epochs, unit='ms', utc=True).dt.tz_convert(OUTPUT_TIMEZONE)
+    return local.dt.strftime('%Y-%m-%d %H:%M:%S')
 
 
 class OutputGenerator:
@@ -32,13 +44,27 @@ class OutputGenerator:
         
         print(f"\n💾 Creating detailed CSV: {output_file}")
         
+        df = self.build_detailed_frame(metrics)
+        
+        # Save to CSV
+        df.to_csv(output_file, index=False)
+        
+        print(f"✅ Detailed CSV created: {output_file}")
+        print(f"   📊 Records: {len(df)}")
+        print(f"   📋 Columns: {len(df.columns)}")
+        
+        return output_file
+    
+    def build_detailed_frame(self, metrics: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Build the detailed output table (one formatted row per shipment)
+        """
         df = pd.DataFrame(metrics)
         
-        # Format datetime columns
+        # Format datetime columns: UTC epoch ms -> IST, one vectorized conversion per column
         for col in ['pickup_datetime_ist', 'delivery_datetime_ist']:
             if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-                df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+                df[col] = format_ist(df[col])
         
         # Ensure numeric columns
         numeric_cols = [
@@ -60,23 +86,17 @@ class OutputGenerator:
             'num_facilities_visited', 'num_in_transit_events',
             'time_in_inter_facility_transit_hours', 'avg_hours_per_facility',
             'is_express_service', 'delivery_location_type',
-            'num_out_for_delivery_attempts', 'first_attempt_delivery', 'total_events_count'
+            'num_out_for_delivery_attempts', 'first_attempt_delivery', 'total_events_count',
+            'shipment_status'
         ]
         
         # Keep only existing columns
         final_columns = [col for col in required_columns if col in df.columns]
-        df = df[final_columns]
-        
-        # Save to CSV
-        df.to_csv(output_file, index=False)
-        
-        print(f"✅ Detailed CSV created: {output_file}")
-        print(f"   📊 Records: {len(df)}")
-        print(f"   📋 Columns: {len(df.columns)}")
-        
-        return output_file
+        return df[final_columns]
     
-    def generate_summary_csv(self, metrics: List[Dict[str, Any]]) -> str:
+    def generate_summary_csv(self, metrics: List[Dict[str, Any]],
+                             sketches: Optional[NetworkSketches] = None,
+                             processing_stats: Optional[Dict[str, int]] = None) -> str:
         """
         Generate summary CSV file
         """
@@ -88,9 +108,31 @@ class OutputGenerator:
         
         print(f"\n💾 Creating summary CSV: {output_file}")
         
-        df = pd.DataFrame(metrics)
+        summary_df = self.build_summary_frame(metrics, sketches, processing_stats)
+        summary_df.to_csv(output_file, index=False)
+        
+        print(f"✅ Summary CSV created: {output_file}")
+        print(f"   📊 Metrics: {len(summary_df)}")
+        
+        return output_file
+    
+    def build_summary_frame(self, metrics: List[Dict[str, Any]],
+                            sketches: Optional[NetworkSketches] = None,
+                            processing_stats: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+        """
+        Build the summary output table (metric_category / metric_name / metric_value)
+        """
+        all_df = pd.DataFrame(metrics)
         summary_data = []
         
+        # In in-flight mode (shipment_status set), transit statistics cover
+        # delivered shipments only; open shipments are reported separately
+        # so their zero transit hours don't skew them
+        in_flight_mode = 'shipment_status' in all_df.columns and all_df['shipment_status'].notna().any()
+        df = all_df
+        if in_flight_mode:
+            df = all_df[all_df['shipment_status'] != 'in_flight']
+        
         def safe_stats(series):
             """Safe statistics calculation"""
             clean = pd.to_numeric(series, errors='coerce').dropna()
@@ -105,7 +147,7 @@ class OutputGenerator:
             )
         
         # Overall Metrics
-        total_shipments = len(df)
+        total_shipments = len(all_df)
         avg_transit, median_transit, std_transit, min_transit, max_transit = safe_stats(df['total_transit_hours'])
         
         summary_data.extend([
@@ -117,6 +159,10 @@ class OutputGenerator:
             {'metric_category': 'Overall Metrics', 'metric_name': 'max_transit_hours', 'metric_value': round(max_transit, 4)}
         ])
         
+        # Percentiles and SLA breaches (partition-based selection, no per-group sorts)
+        percentile_rows = percentile_summary_rows(df)
+        summary_data.extend(percentile_rows['overall'])
+        
         # Facility Metrics
         avg_facilities, median_facilities, _, _, _ = safe_stats(df['num_facilities_visited'])
         avg_hours_facility, median_hours_facility, _, _, _ = safe_stats(df['avg_hours_per_facility'])
@@ -142,6 +188,10 @@ class OutputGenerator:
                 {'metric_category': f'Service Type: {service_type}', 'metric_name': 'avg_facilities_by_service_type', 'metric_value': round(service_avg_facilities, 4)},
                 {'metric_category': f'Service Type: {service_type}', 'metric_name': 'count_shipments_by_service_type', 'metric_value': len(group)}
             ])
+            summary_data.extend(percentile_rows['service'].get(service_type, []))
+        
+        # Lane Comparison
+        summary_data.extend(percentile_rows['lane'])
         
         # Delivery Performance
         first_attempt_rate = df['first_attempt_delivery'].mean() * 100
@@ -152,12 +202,87 @@ class OutputGenerator:
             {'metric_category': 'Delivery Performance', 'metric_name': 'avg_out_for_delivery_attempts', 'metric_value': round(avg_attempts, 4)}
         ])
         
-        # Create and save summary
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_csv(output_file, index=False)
+        # In-flight backlog
+        if in_flight_mode:
+            summary_data.extend(self._in_flight_summary_rows(all_df))
         
-        print(f"✅ Summary CSV created: {output_file}")
-        print(f"   📊 Metrics: {len(summary_df)}")
+        # Data quality counters from event processing
+        if processing_stats:
+            summary_data.extend([
+                {'metric_category': 'Data Quality', 'metric_name': name, 'metric_value': value}
+                for name, value in processing_stats.items()
+            ])
+        
+        # Network cardinality and heavy hitters from streaming sketches
+        if sketches is not None:
+            summary_data.extend(sketches.summary_rows())
+        
+        return pd.DataFrame(summary_data)
+    
+    def _in_flight_summary_rows(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Summary rows for shipments that are not yet delivered
+        """
+        category = 'In-Flight Backlog'
+        in_flight = df[df['shipment_status'] == 'in_flight']
+        rows = [
+            {'metric_category': category, 'metric_name': 'count_delivered_shipments', 'metric_value': len(df) - len(in_flight)},
+            {'metric_category': category, 'metric_name': 'count_in_flight_shipments', 'metric_value': len(in_flight)}
+        ]
+        
+        elapsed = pd.to_numeric(in_flight.get('elapsed_hours_since_pickup'), errors='coerce').dropna()
+        since_scan = pd.to_numeric(in_flight.get('hours_since_last_scan'), errors='coerce').dropna()
+        if elapsed.empty:
+            return rows
+        
+        p90_elapsed = select_percentiles(elapsed.to_numpy(dtype=float), [90])[0]
+        stale = int((since_scan > INFLIGHT_SETTINGS['stale_scan_hours']).sum())
+        rows.extend([
+            {'metric_category': category, 'metric_name': 'avg_elapsed_hours_since_pickup', 'metric_value': round(float(elapsed.mean()), 4)},
+            {'metric_category': category, 'metric_name': 'p90_elapsed_hours_since_pickup', 'metric_value': round(p90_elapsed, 4)},
+            {'metric_category': category, 'metric_name': 'max_elapsed_hours_since_pickup', 'metric_value': round(float(elapsed.max()), 4)},
+            {'metric_category': category, 'metric_name': 'avg_hours_since_last_scan', 'metric_value': round(float(since_scan.mean()), 4)},
+            {'metric_category': category, 'metric_name': 'count_stale_in_flight_shipments', 'metric_value': stale}
+        ])
+        
+        for service_type, count in in_flight['service_type'].value_counts().items():
+            rows.append({'metric_category': category, 'metric_name': f'count_in_flight_{service_type}', 'metric_value': int(count)})
+        
+        return rows
+    
+    def generate_in_flight_csv(self, metrics: List[Dict[str, Any]]) -> str:
+        """
+        Generate live backlog CSV (undelivered shipments, longest silence first)
+        """
+        in_flight = [
+            m for m in metrics
+            if m.get('shipment_status') == 'in_flight' and m.get('hours_since_last_scan') is not None
+        ]
+        if not in_flight:
+            print("\n✅ No in-flight shipments")
+            return ""
+        
+        output_file = INFLIGHT_SETTINGS['in_flight_file']
+        
+        print(f"\n💾 Creating in-flight CSV: {output_file}")
+        
+        df = pd.DataFrame(in_flight)
+        df['lane'] = [lane_key(m) for m in in_flight]
+        for col in ['pickup_datetime_ist', 'last_scan_datetime_ist']:
+            df[col] = format_ist(df[col])
+        df['is_stale'] = df['hours_since_last_scan'] > INFLIGHT_SETTINGS['stale_scan_hours']
+        
+        columns = [
+            'tracking_number', 'service_type', 'carrier_code', 'lane',
+            'pickup_datetime_ist', 'last_scan_datetime_ist', 'elapsed_hours_since_pickup',
+            'hours_since_last_scan', 'is_stale', 'current_facility',
+            'num_facilities_visited', 'num_out_for_delivery_attempts', 'total_events_count'
+        ]
+        df = df[columns].sort_values('hours_since_last_scan', ascending=False, kind='stable')
+        df.to_csv(output_file, index=False)
+        
+        print(f"✅ In-flight CSV created: {output_file}")
+        print(f"   📊 Records: {len(df)}")
         
         return output_file
     
@@ -168,21 +293,31 @@ class OutputGenerator:
         if not metrics:
             return
         
-        df = pd.DataFrame(metrics)
+        all_df = pd.DataFrame(metrics)
+        
+        # Performance figures cover completed shipments only, as in the summary CSV
+        df = all_df
+        if 'shipment_status' in all_df.columns:
+            df = all_df[all_df['shipment_status'] != 'in_flight']
         
         print("\n" + "="*50)
         print("📋 ANALYSIS REPORT")
         print("="*50)
         
-        print(f"📦 Total Shipments: {len(df):,}")
+        print(f"📦 Total Shipments: {len(all_df):,}")
+        if len(df) < len(all_df):
+            print(f"   In flight: {len(all_df) - len(df):,}")
         
         # Service distribution
-        service_dist = df['service_type'].value_counts()
+        service_dist = all_df['service_type'].value_counts()
         print(f"\n🎯 Service Distribution:")
         for service, count in service_dist.items():
-            pct = (count / len(df)) * 100
+            pct = (count / len(all_df)) * 100
             print(f"   {service}: {count} ({pct:.1f}%)")
         
+        if df.empty:
+            return
+        
         # Performance summary
         print(f"\n⏱️  Transit Performance:")
         print(f"   Average: {df['total_transit_hours'].mean():.2f} hours")
@@ -0,0 +1,244 @@
+"""
+Bounded-memory pipeline scheduler linking stages with batch queues
+"""
+import queue
+import sys
+import threading
+import time
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+
+from config.constants import PIPELINE_SETTINGS
+
+# End-of-stream marker passed through the queues
+_END = object()
+
+
+def _deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Approximate retained size in bytes of nested dicts/lists/tuples/sets
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def _estimate_batch_bytes(batch: List[Any], sample_size: int = 16) -> int:
+    """
+    Batch size estimate from a deep size of evenly spaced sample records,
+    so measuring memory stays cheap next to the stage work itself
+    """
+    if len(batch) <= sample_size:
+        return _deep_sizeof(batch)
+
+    step = len(batch) / sample_size
+    sampled = sum(_deep_sizeof(batch[int(i * step)]) for i in range(sample_size))
+    return sys.getsizeof(batch) + int(sampled * len(batch) / sample_size)
+
+
+class StageStats:
+    """
+    Throughput and memory counters for one pipeline stage
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.batches = 0
+        self.records_in = 0
+        self.records_out = 0
+        self.busy_seconds = 0.0
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+        self.peak_queue_depth = 0
+        self._lock = threading.Lock()
+
+    def produced(self, nbytes: int) -> None:
+        with self._lock:
+            self.in_flight_bytes += nbytes
+            self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+
+    def queued(self, queue_depth: int) -> None:
+        with self._lock:
+            self.peak_queue_depth = max(self.peak_queue_depth, queue_depth)
+
+    def released(self, nbytes: int) -> None:
+        with self._lock:
+            self.in_flight_bytes -= nbytes
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'batches': self.batches,
+            'records_in': self.records_in,
+            'records_out': self.records_out,
+            'busy_seconds': round(self.busy_seconds, 4),
+            'peak_in_flight_kb': round(self.peak_in_flight_bytes / 1024, 1),
+            'peak_queue_depth': self.peak_queue_depth
+        }
+
+
+class PipelineScheduler:
+    """
+    Runs a source and a chain of batch stages in threads linked by bounded
+    queues; a full queue blocks its producer (backpressure), so only
+    `queue_size` batches per link plus one batch per stage are in memory
+
+    Peak memory per stage is the largest number of bytes of that stage's
+    output batches alive at once (queued or being consumed downstream).
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, queue_size: Optional[int] = None):
+        self.batch_size = batch_size or PIPELINE_SETTINGS['batch_size']
+        self.queue_size = queue_size or PIPELINE_SETTINGS['queue_size']
+        if self.batch_size < 1 or self.queue_size < 1:
+            raise ValueError("batch_size and queue_size must be positive")
+        self.stats: List[StageStats] = []
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def run(self, source: Iterable[Any],
+            stages: List[Tuple[str, Callable[[List[Any]], List[Any]]]],
+            sink: Callable[[List[Any]], None]) -> List[Dict[str, Any]]:
+        """
+        Stream `source` records through `stages` in batches and hand every
+        final batch to `sink`; returns per-stage statistics
+        """
+        self._stop.clear()
+        self._errors = []
+        self.stats = [StageStats('source')] + [StageStats(name) for name, _ in stages]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stats]
+
+        threads = [threading.Thread(target=self._run_source, args=(source, queues[0], self.stats[0]), daemon=True)]
+        for i, (_, stage_fn) in enumerate(stages, 1):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(stage_fn, queues[i - 1], self.stats[i - 1], queues[i], self.stats[i]),
+                daemon=True
+            ))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._drain(queues[-1], self.stats[-1], sink)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        return [stage.as_dict() for stage in self.stats]
+
+    def _put(self, out_queue: queue.Queue, stats: StageStats, batch: Any) -> bool:
+        """Blocking put that gives up when the pipeline is stopping"""
+        nbytes = _estimate_batch_bytes(batch) if batch is not _END else 0
+        # Count the bytes before the put: the consumer may release them
+        # as soon as the batch is in the queue
+        stats.produced(nbytes)
+        while not self._stop.is_set():
+            try:
+                out_queue.put((batch, nbytes), timeout=0.1)
+                if batch is not _END:
+                    stats.queued(out_queue.qsize())
+                return True
+            except queue.Full:
+                continue
+        stats.released(nbytes)
+        return False
+
+    def _get(self, in_queue: queue.Queue) -> Tuple[Any, int]:
+        """Blocking get that gives up when the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END, 0
+
+    def _run_source(self, source: Iterable[Any], out_queue: queue.Queue, stats: StageStats) -> None:
+        try:
+            batch = []
+            start = time.perf_counter()
+            for record in source:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    stats.busy_seconds += time.perf_counter() - start
+                    stats.batches += 1
+                    stats.records_out += len(batch)
+                    if not self._put(out_queue, stats, batch):
+                        return
+                    batch = []
+                    start = time.perf_counter()
+            stats.busy_seconds += time.perf_counter() - start
+            if batch:
+                stats.batches += 1
+                stats.records_out += len(batch)
+                if not self._put(out_queue, stats, batch):
+                    return
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(out_queue, stats, _END)
+
+    def _run_stage(self, stage_fn: Callable[[List[Any]], List[Any]],
+                   in_queue: queue.Queue, in_stats: StageStats,
+                   out_queue: queue.Queue, stats: StageStats) -> None:
+        try:
+            while True:
+                batch, nbytes = self._get(in_queue)
+                if batch is _END:
+                    break
+
+                start = time.perf_counter()
+                result = stage_fn(batch)
+                stats.busy_seconds += time.perf_counter() - start
+                stats.batches += 1
+                stats.records_in += len(batch)
+                stats.records_out += len(result)
+
+                # Input batch is no longer referenced once the stage has run
+                del batch
+                in_stats.released(nbytes)
+
+                if not self._put(out_queue, stats, result):
+                    break
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(out_queue, stats, _END)
+
+    def _drain(self, in_queue: queue.Queue, in_stats: StageStats,
+               sink: Callable[[List[Any]], None]) -> None:
+        while True:
+            batch, nbytes = self._get(in_queue)
+            if batch is _END:
+                return
+            sink(batch)
+            in_stats.released(nbytes)
+
+
+def process_peak_rss_kb() -> Optional[float]:
+    """
+    Peak resident set size of this process in KB (None where unavailable)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / 1024 if sys.platform == 'darwin' else float(peak)
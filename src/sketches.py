@@ -0,0 +1,268 @@
+"""
+Mergeable streaming sketches for high-cardinality shipment dimensions
+"""
+import hashlib
+import heapq
+import math
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+from config.constants import SKETCH_SETTINGS
+from src.classifiers import ShipmentClassifiers
+from src.transit_stats import lane_key
+
+
+# Mask for 64-bit unsigned arithmetic
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+@lru_cache(maxsize=65536)
+def _hash128(value: Any) -> Tuple[int, int]:
+    """
+    Stable pair of 64-bit hashes from one digest (Python's hash() is salted
+    per process, so shards would disagree); memoized since facilities,
+    lanes and postal codes repeat across shipments
+    """
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be in [4, 18], got {precision}")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = np.zeros(self.num_registers, dtype=np.uint8)
+
+    def add(self, value: Any) -> None:
+        """Add a value to the sketch"""
+        h = _hash128(value)[0]
+        index = h >> (64 - self.precision)
+        remaining = (h << self.precision) & _MASK64
+        # Position of the leftmost 1-bit in the remaining bits (1-based)
+        rank = (64 - self.precision + 1) if remaining == 0 else (65 - remaining.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Merge another sketch into this one (register-wise max)"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values"""
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+
+        # Small-range correction (linear counting)
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class CountMinSketch:
+    """
+    Count-Min frequency sketch
+
+    Increments are buffered per distinct value and scattered into the table
+    in bulk, so a single add() is a dict update rather than a numpy call.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, flush_size: int = 4096):
+        self.width = width
+        self.depth = depth
+        self.flush_size = flush_size
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self._pending: Dict[Any, int] = {}
+
+    def _columns(self, value: Any) -> List[int]:
+        # Double hashing: row i uses h1 + i * h2
+        h1, h2 = _hash128(value)
+        return [((h1 + row * h2) & _MASK64) % self.width for row in range(self.depth)]
+
+    def add(self, value: Any, count: int = 1) -> None:
+        """Increment the count of a value"""
+        self._pending[value] = self._pending.get(value, 0) + count
+        self.total += count
+        if len(self._pending) >= self.flush_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        columns = np.array([self._columns(value) for value in self._pending], dtype=np.int64)
+        counts = np.fromiter(self._pending.values(), dtype=np.int64, count=len(self._pending))
+        rows = np.broadcast_to(np.arange(self.depth), columns.shape)
+        np.add.at(self.table, (rows, columns), counts[:, None])
+        self._pending.clear()
+
+    def estimate(self, value: Any) -> int:
+        """Estimated count of a value (never underestimates)"""
+        self._flush()
+        table = self.table
+        return int(min(table[row, column] for row, column in enumerate(self._columns(value))))
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """Merge another sketch into this one (cell-wise sum)"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge Count-Min sketches with different dimensions")
+        self._flush()
+        other._flush()
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary holding at most `capacity` counters
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counters: Dict[Any, int] = {}
+
+    def add(self, value: Any, count: int = 1) -> None:
+        """Increment the count of a value, evicting the smallest counter when full"""
+        if value in self.counters:
+            self.counters[value] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = count
+        else:
+            victim = min(self.counters, key=self.counters.get)
+            self.counters[value] = self.counters.pop(victim) + count
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """Merge another summary into this one (sum counters, keep the largest)"""
+        combined = dict(self.counters)
+        for value, count in other.counters.items():
+            combined[value] = combined.get(value, 0) + count
+        self.counters = dict(heapq.nlargest(self.capacity, combined.items(), key=lambda x: x[1]))
+        return self
+
+    def candidates(self) -> List[Any]:
+        """Values currently tracked"""
+        return list(self.counters)
+
+
+class HeavyHitters:
+    """
+    Top-N tracker: Space-Saving picks candidates, Count-Min ranks them
+    """
+
+    def __init__(self, capacity: int = 100, width: int = 2048, depth: int = 4):
+        self.candidates = SpaceSaving(capacity)
+        self.frequencies = CountMinSketch(width, depth)
+
+    def add(self, value: Any, count: int = 1) -> None:
+        self.candidates.add(value, count)
+        self.frequencies.add(value, count)
+
+    def merge(self, other: 'HeavyHitters') -> 'HeavyHitters':
+        self.candidates.merge(other.candidates)
+        self.frequencies.merge(other.frequencies)
+        return self
+
+    def top(self, n: int) -> List[Tuple[Any, int]]:
+        """Top-n values with their estimated counts"""
+        ranked = [(value, self.frequencies.estimate(value)) for value in self.candidates.candidates()]
+        ranked.sort(key=lambda x: (-x[1], str(x[0])))
+        return ranked[:n]
+
+
+class NetworkSketches:
+    """
+    Network-wide cardinality and heavy-hitter sketches fed from processed shipments
+    """
+
+    def __init__(self, settings: Dict[str, Any] = None, classifiers: ShipmentClassifiers = None):
+        self.settings = dict(SKETCH_SETTINGS, **(settings or {}))
+        self.classifiers = classifiers or ShipmentClassifiers()
+        precision = self.settings['hll_precision']
+        hitter_args = (
+            self.settings['heavy_hitter_capacity'],
+            self.settings['cms_width'],
+            self.settings['cms_depth']
+        )
+
+        self.distinct_facilities = HyperLogLog(precision)
+        self.distinct_postal_codes = HyperLogLog(precision)
+        self.distinct_tracking_numbers = HyperLogLog(precision)
+        self.busiest_facilities = HeavyHitters(*hitter_args)
+        self.busiest_lanes = HeavyHitters(*hitter_args)
+
+    def observe_shipment(self, shipment: Dict[str, Any]) -> None:
+        """
+        Feed one flattened shipment (output of DataProcessor._process_shipment)
+        """
+        self.distinct_tracking_numbers.add(shipment.get('tracking_number'))
+        self.busiest_lanes.add(lane_key(shipment))
+
+        # Postal codes and facilities count once per shipment
+        postal_codes = {shipment.get('origin_pincode'), shipment.get('destination_pincode')}
+        facilities = set()
+        for event in shipment.get('events', []):
+            postal_code = event.get('postal_code')
+            postal_codes.add(postal_code)
+            if self.classifiers.is_facility_event(event):
+                key = f"{event.get('city')}_{event.get('state')}_{postal_code}"
+                if key.strip('_'):
+                    facilities.add(key)
+
+        for postal_code in postal_codes:
+            self._add_postal_code(postal_code)
+
+        for facility in facilities:
+            self.distinct_facilities.add(facility)
+            self.busiest_facilities.add(facility)
+
+    def observe_shipments(self, shipments: Iterable[Dict[str, Any]]) -> None:
+        """Feed several flattened shipments"""
+        for shipment in shipments:
+            self.observe_shipment(shipment)
+
+    def _add_postal_code(self, postal_code: Any) -> None:
+        if postal_code and postal_code != 'UNKNOWN':
+            self.distinct_postal_codes.add(postal_code)
+
+    def merge(self, other: 'NetworkSketches') -> 'NetworkSketches':
+        """
+        Merge sketches from another shard into this one
+        """
+        self.distinct_facilities.merge(other.distinct_facilities)
+        self.distinct_postal_codes.merge(other.distinct_postal_codes)
+        self.distinct_tracking_numbers.merge(other.distinct_tracking_numbers)
+        self.busiest_facilities.merge(other.busiest_facilities)
+        self.busiest_lanes.merge(other.busiest_lanes)
+        return self
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        """
+        Summary CSV rows (metric_category / metric_name / metric_value)
+        """
+        top_n = self.settings['top_n']
+        rows = [
+            {'metric_category': 'Network Cardinality', 'metric_name': 'approx_distinct_facilities', 'metric_value': self.distinct_facilities.count()},
+            {'metric_category': 'Network Cardinality', 'metric_name': 'approx_distinct_postal_codes', 'metric_value': self.distinct_postal_codes.count()},
+            {'metric_category': 'Network Cardinality', 'metric_name': 'approx_distinct_tracking_numbers', 'metric_value': self.distinct_tracking_numbers.count()}
+        ]
+
+        for rank, (facility, count) in enumerate(self.busiest_facilities.top(top_n), 1):
+            rows.append({'metric_category': 'Top Facilities', 'metric_name': f'#{rank} {facility}', 'metric_value': count})
+
+        for rank, (lane, count) in enumerate(self.busiest_lanes.top(top_n), 1):
+            rows.append({'metric_category': 'Top Lanes', 'metric_name': f'#{rank} {lane}', 'metric_value': count})
+
+        return rows
@@ -0,0 +1,157 @@
+"""
+Grouped percentile and SLA-breach statistics using partition-based selection
+"""
+import math
+from typing import List, Dict, Any, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.constants import SLA_TRANSIT_HOURS, SUMMARY_PERCENTILES
+
+
+def lane_key(record: Dict[str, Any]) -> str:
+    """
+    Origin -> destination lane label for a shipment or metrics record
+    """
+    return (
+        f"{record.get('origin_city')}, {record.get('origin_state')} -> "
+        f"{record.get('destination_city')}, {record.get('destination_state')}"
+    )
+
+
+def lane_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    lane_key for every row of a metrics DataFrame, built column-wise
+    """
+    def column(name: str) -> pd.Series:
+        if name not in df:
+            return pd.Series('None', index=df.index)
+        # Missing values read as 'None', like the f-string in lane_key
+        values = df[name]
+        return values.astype(object).where(values.notna(), 'None').astype(str)
+
+    return (
+        column('origin_city') + ', ' + column('origin_state') + ' -> ' +
+        column('destination_city') + ', ' + column('destination_state')
+    )
+
+
+def select_percentiles(values: np.ndarray, percentiles: Sequence[float]) -> List[float]:
+    """
+    Percentiles via np.partition (linear interpolation, same as np.percentile)
+    """
+    n = len(values)
+    if n == 0:
+        return [0.0 for _ in percentiles]
+
+    positions = [p / 100.0 * (n - 1) for p in percentiles]
+    kth = sorted({int(math.floor(pos)) for pos in positions} | {int(math.ceil(pos)) for pos in positions})
+    partitioned = np.partition(values, kth)
+
+    results = []
+    for pos in positions:
+        lower, upper = int(math.floor(pos)), int(math.ceil(pos))
+        low_value, high_value = partitioned[lower], partitioned[upper]
+        results.append(float(low_value + (high_value - low_value) * (pos - lower)))
+    return results
+
+
+def grouped_percentiles(keys: Sequence[Any], values: np.ndarray,
+                        percentiles: Sequence[float]) -> Dict[Any, List[float]]:
+    """
+    Percentiles of `values` for every distinct key
+
+    Keys are factorized once and rows bucketed by a stable sort over the
+    integer group codes, then each bucket is selected in place with
+    np.partition, so no group is ever fully sorted.
+    """
+    if len(values) == 0:
+        return {}
+
+    codes, uniques = pd.factorize(pd.Series(list(keys)), sort=False)
+    codes = codes.astype(np.min_scalar_type(max(len(uniques) - 1, 0)))
+    # numpy's stable sort is a radix (counting) sort for codes that fit in
+    # 16 bits; above 65,535 groups it falls back to timsort (n log n)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques)))))
+    ordered = np.asarray(values, dtype=float)[order]
+
+    return {
+        key: select_percentiles(ordered[bounds[i]:bounds[i + 1]], percentiles)
+        for i, key in enumerate(uniques)
+    }
+
+
+def sla_breaches(service_types: Sequence[str], transit_hours: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-shipment (has_sla, breached) flags against SLA_TRANSIT_HOURS
+    """
+    promised = pd.Series(list(service_types)).map(SLA_TRANSIT_HOURS).to_numpy(dtype=float)
+    has_sla = ~np.isnan(promised)
+    breached = has_sla & (np.asarray(transit_hours, dtype=float) > np.nan_to_num(promised))
+    return has_sla, breached
+
+
+def grouped_sla_breach_pct(keys: Sequence[Any], has_sla: np.ndarray,
+                           breached: np.ndarray) -> Dict[Any, float]:
+    """
+    Percentage of shipments with an SLA that breached it, for every distinct
+    key with at least one SLA-eligible shipment
+    """
+    codes, uniques = pd.factorize(pd.Series(list(keys)), sort=False)
+    eligible = np.bincount(codes, weights=has_sla.astype(float), minlength=len(uniques))
+    late = np.bincount(codes, weights=breached.astype(float), minlength=len(uniques))
+
+    return {
+        key: float(late[i] / eligible[i] * 100)
+        for i, key in enumerate(uniques)
+        if eligible[i]
+    }
+
+
+def percentile_summary_rows(df: pd.DataFrame) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Summary CSV rows for overall, per-service-type and per-lane percentiles and SLA breaches
+
+    Returns rows keyed by 'overall', 'service' (dict by service type) and 'lane'.
+    """
+    transit = pd.to_numeric(df['total_transit_hours'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    services = df['service_type'].astype(str).tolist()
+    lanes = lane_keys(df).tolist()
+    has_sla, breached = sla_breaches(services, transit)
+
+    def percentile_rows(category: str, values: List[float], suffix: str) -> List[Dict[str, Any]]:
+        return [
+            {'metric_category': category, 'metric_name': f'p{p:g}_transit_hours{suffix}', 'metric_value': round(value, 4)}
+            for p, value in zip(SUMMARY_PERCENTILES, values)
+        ]
+
+    overall = percentile_rows('Overall Metrics', select_percentiles(transit, SUMMARY_PERCENTILES), '')
+    overall_eligible = int(has_sla.sum())
+    overall.append({
+        'metric_category': 'Overall Metrics',
+        'metric_name': 'pct_sla_breach',
+        'metric_value': round(float(breached.sum()) / overall_eligible * 100, 4) if overall_eligible else 0.0
+    })
+
+    service_rows = {}
+    service_breach = grouped_sla_breach_pct(services, has_sla, breached)
+    for service_type, values in grouped_percentiles(services, transit, SUMMARY_PERCENTILES).items():
+        category = f'Service Type: {service_type}'
+        rows = percentile_rows(category, values, '_by_service_type')
+        if service_type in SLA_TRANSIT_HOURS:
+            rows.append({'metric_category': category, 'metric_name': 'pct_sla_breach_by_service_type', 'metric_value': round(service_breach[service_type], 4)})
+        service_rows[service_type] = rows
+
+    lane_rows = []
+    lane_breach = grouped_sla_breach_pct(lanes, has_sla, breached)
+    lane_counts = pd.Series(lanes).value_counts(sort=False)
+    for lane, values in grouped_percentiles(lanes, transit, SUMMARY_PERCENTILES).items():
+        category = f'Lane: {lane}'
+        lane_rows.append({'metric_category': category, 'metric_name': 'count_shipments_by_lane', 'metric_value': int(lane_counts[lane])})
+        lane_rows.extend(percentile_rows(category, values, '_by_lane'))
+        if lane in lane_breach:
+            lane_rows.append({'metric_category': category, 'metric_name': 'pct_sla_breach_by_lane', 'metric_value': round(lane_breach[lane], 4)})
+
+    return {'overall': overall, 'service': service_rows, 'lane': lane_rows}
@@ -0,0 +1,132 @@
+"""
+AnomalyDetector: histogram baselines merge like a refit and stay robust to outliers
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.anomaly_detector import AnomalyDetector, histogram_median_mad
+
+HOUR_MS = 3_600_000
+START_MS = 1_700_000_000_000
+
+
+def _shipment(i, hours, delivered_ms=None):
+    return {
+        'tracking_number': f'T{i:05d}',
+        'service_type': 'FEDEX_EXPRESS_SAVER',
+        'origin_city': 'Bangalore', 'origin_state': 'KA',
+        'destination_city': 'Pune', 'destination_state': 'MH',
+        'total_transit_hours': hours,
+        'time_in_inter_facility_transit_hours': hours / 2,
+        'max_scan_gap_hours': hours / 4,
+        'num_out_for_delivery_attempts': 1,
+        'delivery_datetime_ist': delivered_ms if delivered_ms is not None else START_MS + i * HOUR_MS
+    }
+
+
+@pytest.fixture
+def history():
+    rng = np.random.default_rng(7)
+    return [_shipment(i, round(float(hours), 2)) for i, hours in enumerate(rng.normal(50, 5, 100))]
+
+
+def _lane_baseline(detector):
+    return detector.baselines['lane'].iloc[0]
+
+
+def test_histogram_median_mad_matches_pandas():
+    values = pd.Series([1.0, 2.0, 2.0, 3.0, 10.0, 11.0])
+    bins = values.round().astype(int).value_counts().to_dict()
+
+    median, mad = histogram_median_mad(bins, 1.0)
+
+    assert median == values.median()
+    assert mad == (values - values.median()).abs().median()
+
+
+def test_incremental_updates_match_refit_under_outliers(tmp_path, history):
+    cache = str(tmp_path / 'baselines.json')
+
+    detector = AnomalyDetector({'baselines_file': cache})
+    detector.fit(history)
+    detector.save()
+    initial_median = _lane_baseline(detector)['total_transit_hours_median']
+
+    everything = list(history)
+    for run in range(5):
+        outlier = _shipment(1000 + run, 1000.0)
+        everything.append(outlier)
+        detector = AnomalyDetector({'baselines_file': cache})
+        assert detector.load()
+        assert detector.update([outlier]) == 1
+        detector.save()
+
+    refit = AnomalyDetector()
+    refit.fit(everything)
+
+    cached, fresh = _lane_baseline(detector), _lane_baseline(refit)
+    assert cached['count'] == fresh['count'] == 105
+    assert cached['total_transit_hours_median'] == pytest.approx(fresh['total_transit_hours_median'])
+    assert cached['total_transit_hours_mad'] == pytest.approx(fresh['total_transit_hours_mad'])
+    # Five extreme shipments barely move a robust baseline
+    assert abs(cached['total_transit_hours_median'] - initial_median) < 1.0
+    # and a real delay still stands out against it
+    scores = detector.score([_shipment(2000, 80.0)])
+    assert scores.loc[0, 'is_anomaly']
+
+
+def test_rerun_on_same_input_is_idempotent(tmp_path, history):
+    cache = str(tmp_path / 'baselines.json')
+    first = AnomalyDetector({'baselines_file': cache})
+    first.fit(history)
+    first.save()
+
+    second = AnomalyDetector({'baselines_file': cache})
+    assert second.load()
+    assert second.update(history) == 0
+    pd.testing.assert_frame_equal(second.baselines['lane'], first.baselines['lane'])
+
+
+def test_update_folds_only_shipments_after_the_watermark(history):
+    detector = AnomalyDetector()
+    detector.fit(history[:60])
+
+    assert detector.update(history) == 40
+    assert detector.update(history) == 0
+    # A new shipment delivered at exactly the watermark is still folded in once
+    tied = _shipment(5000, 50.0, delivered_ms=detector.watermark)
+    assert detector.update([tied]) == 1
+    assert detector.update([tied]) == 0
+    assert detector.baselines['global'].loc['ALL', 'count'] == 101
+
+
+def test_cache_size_does_not_grow_with_repeated_values(tmp_path, history):
+    cache = tmp_path / 'baselines.json'
+    detector = AnomalyDetector({'baselines_file': str(cache)})
+    detector.fit(history)
+    detector.save()
+    size = cache.stat().st_size
+
+    repeats = [_shipment(10_000 + i, history[i % 100]['total_transit_hours']) for i in range(1000)]
+    detector.update(repeats)
+    detector.save()
+
+    assert cache.stat().st_size < size * 1.2
+
+
+def test_stuck_in_flight_shipment_is_scored_on_open_clocks(history):
+    detector = AnomalyDetector()
+    detector.fit(history)
+
+    stuck = dict(_shipment(3000, 0.0), shipment_status='in_flight', delivery_datetime_ist=None,
+                 max_scan_gap_hours=3.0, elapsed_hours_since_pickup=30.0, hours_since_last_scan=96.0)
+    moving = dict(stuck, tracking_number='T03001', elapsed_hours_since_pickup=20.0, hours_since_last_scan=2.0)
+
+    scores = detector.score([stuck, moving]).set_index('tracking_number')
+
+    assert scores.loc['T03000', 'is_anomaly']
+    assert scores.loc['T03000', 'primary_reason'] == 'max_scan_gap_hours'
+    assert scores.loc['T03000', 'max_scan_gap_hours'] == 96.0
+    assert not scores.loc['T03001', 'is_anomaly']
+    assert (scores['shipment_status'] == 'in_flight').all()
@@ -0,0 +1,112 @@
+"""
+Carrier adapters own field normalization and their own vocabularies
+"""
+import pytest
+
+from src.carriers import CarrierAdapter, FedExAdapter, NormalizedAdapter, default_registry
+from src.data_processor import DataProcessor
+
+
+class ParcelCoAdapter(CarrierAdapter):
+    """Made-up carrier with its own field formats and vocabulary"""
+
+    name = 'parcelco'
+    carrier_codes = ('PCO',)
+    event_categories = {
+        'pickup': ['COLLECTED'],
+        'delivery': ['HANDED OVER'],
+        'in_transit': ['MOVING']
+    }
+    facility_keywords = ['SORT CENTER']
+    express_services = ['PCO_NEXT_DAY']
+
+    def matches(self, record):
+        return isinstance(record, dict) and 'consignment' in record
+
+    def extract_shipments(self, record):
+        consignment = record['consignment']
+        return [self._tag({
+            'trackingNumber': consignment['id'],
+            'carrierCode': 'PCO',
+            'service': {'type': consignment['product']},
+            'package': {'weight': consignment['grams'] / 1000},
+            'origin': {'address': consignment['from']},
+            'destination': {'address': consignment['to']},
+            'events': consignment['scans']
+        })]
+
+    def normalize_address(self, address):
+        town, region, zip_code = address.split('|')
+        return {'city': town, 'state': region, 'postal_code': zip_code}
+
+    def parse_timestamp(self, timestamp):
+        return int(timestamp) * 1000  # epoch seconds
+
+
+def _consignment():
+    return {'consignment': {
+        'id': 'PCO1',
+        'product': 'PCO_NEXT_DAY',
+        'grams': 1500,
+        'from': 'PUNE|MH|411001',
+        'to': 'DELHI|DL|110001',
+        'scans': [
+            {'eventType': 'COLLECTED', 'timestamp': 1700000000, 'address': 'PUNE|MH|411001',
+             'arrivalLocation': 'PICKUP_POINT'},
+            {'eventType': 'MOVING', 'timestamp': 1700003600, 'address': 'NAGPUR|MH|440001',
+             'arrivalLocation': 'NAGPUR SORT CENTER'},
+            {'eventType': 'HANDED OVER', 'timestamp': 1700090000, 'address': 'DELHI|DL|110001',
+             'arrivalLocation': 'DOORSTEP'}
+        ]
+    }}
+
+
+def test_base_adapter_is_abstract():
+    with pytest.raises(TypeError):
+        CarrierAdapter()
+
+
+def test_custom_adapter_normalizes_its_own_formats():
+    registry = default_registry()
+    registry.register(ParcelCoAdapter())
+    adapter = registry.resolve(_consignment())
+    shipment = adapter.extract_shipments(_consignment())[0]
+
+    flattened = DataProcessor(registry=registry)._process_shipment(shipment)
+
+    assert flattened['carrier_adapter'] == 'parcelco'
+    assert flattened['package_weight_kg'] == 1.5
+    assert (flattened['origin_city'], flattened['destination_pincode']) == ('PUNE', '110001')
+    assert [e['timestamp'] for e in flattened['events']] == [1700000000000, 1700003600000, 1700090000000]
+    assert [e['category'] for e in flattened['events']] == ['pickup', 'in_transit', 'delivery']
+    assert [e['is_facility'] for e in flattened['events']] == [False, True, False]
+    assert flattened['is_express_service'] is True
+
+
+def test_vocabularies_are_per_carrier():
+    parcelco, fedex = ParcelCoAdapter(), FedExAdapter()
+
+    assert parcelco.is_facility_location('NAGPUR SORT CENTER')
+    assert not parcelco.is_facility_location('FEDEX_FACILITY')
+    assert fedex.is_facility_location('FEDEX_FACILITY')
+    assert not fedex.is_facility_location('NAGPUR SORT CENTER')
+    assert not fedex.is_express('PCO_NEXT_DAY')
+
+
+def test_fedex_and_normalized_timestamps():
+    assert FedExAdapter().parse_timestamp({'$numberLong': '1584691620000'}) == 1584691620000
+    assert NormalizedAdapter().parse_timestamp('2020-03-20T08:07:00Z') == 1584691620000
+    assert NormalizedAdapter().normalize_address({'city': 'PUNE', 'state': 'MH', 'postal_code': '411001'}) == {
+        'city': 'PUNE', 'state': 'MH', 'postal_code': '411001'
+    }
+
+
+def test_rules_file_extends_only_the_named_carrier(tmp_path):
+    rules_file = tmp_path / 'rules.json'
+    rules_file.write_text('{"facility_keywords": ["GATEWAY"], "carriers": {"parcelco": {"facility_keywords": ["DEPOT"]}}}')
+
+    parcelco, fedex = ParcelCoAdapter(str(rules_file)), FedExAdapter(str(rules_file))
+
+    assert parcelco.is_facility_location('DEPOT 4') and fedex.is_facility_location('AIR GATEWAY')
+    assert parcelco.is_facility_location('AIR GATEWAY')
+    assert not fedex.is_facility_location('DEPOT 4')
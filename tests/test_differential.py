@@ -0,0 +1,60 @@
+"""
+compare_frames: keyed row matching, tolerances and repeated keys
+"""
+import numpy as np
+import pandas as pd
+
+from src.differential import compare_frames
+
+
+def _compare(baseline, candidate):
+    return compare_frames(baseline, candidate, ['tracking_number'], rtol=1e-9, atol=1e-6, max_diffs=10)
+
+
+def test_identical_frames_match_regardless_of_row_order():
+    frame = pd.DataFrame({'tracking_number': ['1', '2', '3'], 'hours': [1.0, 2.0, np.nan], 'city': ['A', None, 'C']})
+
+    result = _compare(frame, frame.iloc[::-1].reset_index(drop=True))
+
+    assert result['matched']
+    assert result['rows_compared'] == 3
+
+
+def test_numeric_tolerance_and_string_differences():
+    baseline = pd.DataFrame({'tracking_number': ['1', '2'], 'hours': [1.0, 2.0], 'city': ['A', 'B']})
+    candidate = pd.DataFrame({'tracking_number': ['1', '2'], 'hours': [1.0 + 1e-9, 2.5], 'city': ['A', 'X']})
+
+    result = _compare(baseline, candidate)
+
+    assert not result['matched']
+    assert result['difference_count'] == 2
+    assert {(d['key'], d['column']) for d in result['first_differences']} == {('2', 'hours'), ('2', 'city')}
+
+
+def test_repeated_keys_are_matched_by_occurrence():
+    baseline = pd.DataFrame({'tracking_number': ['1', '2', '2'], 'hours': [1.0, 5.0, 7.0]})
+    candidate = pd.DataFrame({'tracking_number': ['1', '2', '2'], 'hours': [1.0, 5.0, 8.0]})
+
+    result = _compare(baseline, candidate)
+
+    assert result['rows_compared'] == 3
+    assert result['baseline_duplicate_keys'] == result['candidate_duplicate_keys'] == 1
+    assert result['difference_count'] == 1
+    assert result['first_differences'][0]['key'] == '2 #2'
+    assert (result['first_differences'][0]['baseline'], result['first_differences'][0]['candidate']) == (7.0, 8.0)
+
+
+def test_repeated_keys_with_equal_values_match():
+    frame = pd.DataFrame({'tracking_number': ['1', '2', '2'], 'hours': [1.0, 5.0, 7.0]})
+
+    assert _compare(frame, frame.copy())['matched']
+
+
+def test_extra_repeat_is_reported():
+    baseline = pd.DataFrame({'tracking_number': ['1', '2'], 'hours': [1.0, 5.0]})
+    candidate = pd.DataFrame({'tracking_number': ['1', '2', '2'], 'hours': [1.0, 5.0, 5.0]})
+
+    result = _compare(baseline, candidate)
+
+    assert not result['matched']
+    assert result['extra_rows'] == ['2 #2']
@@ -0,0 +1,72 @@
+"""
+In-flight mode: status tagging follows as_of and open shipments stay out of transit statistics
+"""
+import copy
+
+import pytest
+
+from src.metrics_calculator import MetricsCalculator
+from src.output_generator import OutputGenerator
+
+AS_OF = 1767225600000  # 2026-01-01T00:00:00Z
+
+
+def _shipment(tracking_number, events):
+    return {
+        'tracking_number': tracking_number, 'service_type': 'FEDEX_2_DAY', 'carrier_code': 'FDXE',
+        'package_weight_kg': 1.0, 'packaging_type': 'BOX',
+        'origin_city': 'Pune', 'origin_state': 'MH', 'origin_pincode': '411001',
+        'destination_city': 'Delhi', 'destination_state': 'DL', 'destination_pincode': '110001',
+        'delivery_location_type': 'RESIDENTIAL', 'events': events
+    }
+
+
+def _event(category, hour):
+    return {'event_type': category[:2].upper(), 'timestamp': AS_OF - 500 * 3_600_000 + hour * 3_600_000,
+            'description': '', 'city': 'Pune', 'state': 'MH', 'postal_code': '411001',
+            'arrival_location': 'FACILITY', 'is_facility': True, 'category': category}
+
+
+@pytest.fixture
+def flattened():
+    return [
+        _shipment('DELIVERED', [_event('pickup', 0), _event('in_transit', 10), _event('delivery', 100)]),
+        _shipment('OPEN', [_event('pickup', 0), _event('in_transit', 10)])
+    ]
+
+
+def _metrics(flattened, as_of):
+    return MetricsCalculator(as_of=as_of).calculate_metrics(copy.deepcopy(flattened))
+
+
+def test_status_only_tagged_in_in_flight_mode(flattened):
+    assert {m['shipment_status'] for m in _metrics(flattened, None)} == {None}
+    assert [m['shipment_status'] for m in _metrics(flattened, AS_OF)] == ['delivered', 'in_flight']
+
+
+def test_summary_unchanged_when_mode_disabled(flattened):
+    summary = OutputGenerator().build_summary_frame(_metrics(flattened, None)).set_index('metric_name')
+
+    assert summary.loc['avg_transit_hours', 'metric_value'] == 50.0
+    assert 'count_in_flight_shipments' not in summary.index
+
+
+def test_in_flight_excluded_from_transit_statistics(flattened, capsys):
+    metrics = _metrics(flattened, AS_OF)
+    output_generator = OutputGenerator()
+    summary = output_generator.build_summary_frame(metrics).set_index('metric_name')
+
+    assert summary.loc['avg_transit_hours', 'metric_value'] == 100.0
+    assert summary.loc['count_in_flight_shipments', 'metric_value'] == 1
+
+    output_generator.print_report(metrics)
+    report = capsys.readouterr().out
+    assert 'Average: 100.00 hours' in report
+    assert 'In flight: 1' in report
+
+
+def test_detailed_frame_marks_in_flight_rows(flattened):
+    detailed = OutputGenerator().build_detailed_frame(_metrics(flattened, AS_OF)).set_index('tracking_number')
+
+    assert detailed.loc['OPEN', 'shipment_status'] == 'in_flight'
+    assert detailed.loc['DELIVERED', 'shipment_status'] == 'delivered'
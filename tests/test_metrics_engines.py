@@ -0,0 +1,52 @@
+"""
+Regression test: the fused metrics kernel matches the legacy multi-pass
+engine and the committed detailed CSV on data/shipment_data.json
+"""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from src.data_loader import DataLoader
+from src.data_processor import DataProcessor
+from src.metrics_calculator import MetricsCalculator
+from src.output_generator import OutputGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILE = os.path.join(ROOT, 'data', 'shipment_data.json')
+DETAILED_CSV = os.path.join(ROOT, 'output', 'transit_performance_detailed.csv')
+
+# Fixed in-flight reference time so the records are reproducible
+AS_OF = 1767225600000  # 2026-01-01T00:00:00Z
+
+
+@pytest.fixture(scope='module')
+def flattened():
+    shipments = list(DataLoader().iter_shipments(DATA_FILE))
+    return DataProcessor().process_shipments(shipments)
+
+
+def _metrics(flattened, engine):
+    return MetricsCalculator(engine=engine, as_of=AS_OF).calculate_metrics(flattened)
+
+
+def _read_csv(source):
+    return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+
+def test_fused_matches_legacy_records(flattened):
+    fused = _metrics(flattened, 'fused')
+    legacy = _metrics(flattened, 'legacy')
+
+    assert len(fused) == len(legacy) > 0
+    assert fused == legacy
+
+
+def test_fused_matches_committed_detailed_csv(flattened):
+    detailed = OutputGenerator().build_detailed_frame(_metrics(flattened, 'fused'))
+    buffer = io.StringIO()
+    detailed.to_csv(buffer, index=False)
+    buffer.seek(0)
+
+    pd.testing.assert_frame_equal(_read_csv(buffer), _read_csv(DETAILED_CSV))
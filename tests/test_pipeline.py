@@ -0,0 +1,107 @@
+"""
+PipelineScheduler: ordering, backpressure, memory accounting and error propagation
+"""
+import threading
+import time
+
+import pytest
+
+from src.pipeline import PipelineScheduler
+
+
+def test_records_flow_through_stages_in_order():
+    results = []
+    stats = PipelineScheduler(batch_size=7, queue_size=2).run(
+        iter(range(100)),
+        [('double', lambda batch: [x * 2 for x in batch]),
+         ('odd_only', lambda batch: [x + 1 for x in batch])],
+        results.extend
+    )
+
+    assert results == [x * 2 + 1 for x in range(100)]
+    assert [s['stage'] for s in stats] == ['source', 'double', 'odd_only']
+    assert stats[0]['records_out'] == stats[1]['records_in'] == 100
+    assert stats[0]['batches'] == 15
+
+
+def test_full_queue_blocks_the_producer():
+    queue_size, batch_size = 2, 5
+    produced = []
+    release = threading.Event()
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    def slow_sink(batch):
+        release.wait(timeout=5)
+
+    scheduler = PipelineScheduler(batch_size=batch_size, queue_size=queue_size)
+    runner = threading.Thread(
+        target=scheduler.run, args=(source(), [('identity', list)], slow_sink)
+    )
+    runner.start()
+    time.sleep(0.5)
+
+    # With the sink blocked, the source can only run ahead by `queue_size`
+    # batches per link plus one batch held by each thread
+    bound = (2 * queue_size + 4) * batch_size
+    assert len(produced) <= bound
+    release.set()
+    runner.join(timeout=10)
+
+    assert not runner.is_alive()
+    assert len(produced) == 100
+    assert all(stage.peak_queue_depth <= queue_size for stage in scheduler.stats)
+
+
+def test_in_flight_bytes_balance_and_never_go_negative():
+    scheduler = PipelineScheduler(batch_size=3, queue_size=1)
+    observed = []
+
+    scheduler.run(
+        iter(range(300)),
+        [('copy', lambda batch: [dict(value=x) for x in batch])],
+        lambda batch: observed.append(min(s.in_flight_bytes for s in scheduler.stats))
+    )
+
+    assert min(observed) >= 0
+    assert all(s.in_flight_bytes == 0 for s in scheduler.stats)
+    assert all(s.peak_in_flight_bytes > 0 for s in scheduler.stats)
+
+
+def test_stage_error_is_raised_and_stops_the_pipeline():
+    def failing(batch):
+        if 50 in batch:
+            raise ValueError("bad record")
+        return batch
+
+    consumed = []
+    with pytest.raises(ValueError, match="bad record"):
+        PipelineScheduler(batch_size=10, queue_size=1).run(
+            iter(range(10_000)), [('failing', failing)], consumed.extend
+        )
+
+    assert 50 not in consumed
+    assert len(consumed) < 10_000
+
+
+def test_sink_and_source_errors_propagate():
+    with pytest.raises(RuntimeError, match="sink"):
+        PipelineScheduler(batch_size=2).run(
+            iter(range(10)), [('identity', list)],
+            lambda batch: (_ for _ in ()).throw(RuntimeError("sink"))
+        )
+
+    def broken_source():
+        yield 1
+        raise KeyError("source")
+
+    with pytest.raises(KeyError):
+        PipelineScheduler(batch_size=2).run(broken_source(), [('identity', list)], lambda batch: None)
+
+
+def test_invalid_settings_rejected():
+    with pytest.raises(ValueError):
+        PipelineScheduler(batch_size=-1)
@@ -0,0 +1,64 @@
+"""
+Shard merging: sketches fed from two halves and merged report the same
+summary rows as one sketch fed from the whole stream
+"""
+import contextlib
+import io
+import os
+
+import pytest
+
+from src.data_loader import DataLoader
+from src.data_processor import DataProcessor
+from src.sketches import NetworkSketches, HyperLogLog, CountMinSketch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILE = os.path.join(ROOT, 'data', 'shipment_data.json')
+
+
+@pytest.fixture(scope='module')
+def flattened():
+    with contextlib.redirect_stdout(io.StringIO()):
+        shipments = list(DataLoader().iter_shipments(DATA_FILE))
+        return DataProcessor().process_shipments(shipments)
+
+
+def test_merged_shards_match_single_stream(flattened):
+    whole = NetworkSketches()
+    whole.observe_shipments(flattened)
+
+    middle = len(flattened) // 2
+    left, right = NetworkSketches(), NetworkSketches()
+    left.observe_shipments(flattened[:middle])
+    right.observe_shipments(flattened[middle:])
+
+    assert left.merge(right).summary_rows() == whole.summary_rows()
+
+
+def test_hyperloglog_merge_is_registerwise_max():
+    left, right, whole = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+    for i in range(5000):
+        (left if i % 2 else right).add(f'item-{i}')
+        whole.add(f'item-{i}')
+
+    assert left.merge(right).count() == whole.count()
+    assert abs(whole.count() - 5000) / 5000 < 0.1
+
+
+def test_count_min_merge_includes_pending_increments():
+    left, right = CountMinSketch(width=64, depth=3), CountMinSketch(width=64, depth=3)
+    left.add('lane-a', 3)
+    right.add('lane-a', 4)
+    right.add('lane-b')
+
+    merged = left.merge(right)
+    assert merged.total == 8
+    assert merged.estimate('lane-a') >= 7
+    assert merged.estimate('lane-b') >= 1
+
+
+def test_merge_rejects_mismatched_dimensions():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+    with pytest.raises(ValueError):
+        CountMinSketch(width=64).merge(CountMinSketch(width=128))